@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+# Fluxos independentes de números aleatórios de uma simulação. Cada fonte de incerteza
+# tem o seu gerador, derivado da seed por SeedSequence.spawn: mudar o número de médicos
+# não desloca as chegadas nem as triagens, o que torna a comparação de cenários com a
+# mesma seed (números aleatórios comuns) muito mais precisa.
+FLUXOS = ("chegadas", "servico", "triagem")
+
+# Modos de amostragem: "direta" usa os métodos do NumPy; "inversao" e "antitetica" geram
+# tudo por inversão de uniformes, U e 1-U (ou z e -z na normal), para se poder emparelhar
+# uma corrida com a sua antitética.
+AMOSTRAGENS = ("direta", "inversao", "antitetica")
+
+
+class GeradorInversao:
+    """Gerador por inversão da função de distribuição, com a versão antitética opcional.
+
+    Expõe o subconjunto da API de np.random.Generator usado pela simulação. Com
+    antitetico=True cada uniforme U passa a 1-U e cada normal z passa a -z.
+    """
+
+    def __init__(self, rng: np.random.Generator, antitetico: bool = False):
+        self._rng = rng
+        self.antitetico = antitetico
+
+    def random(self, size=None):
+        u = self._rng.random(size)
+        return 1.0 - u if self.antitetico else u
+
+    def standard_normal(self, size=None):
+        z = self._rng.standard_normal(size)
+        return -z if self.antitetico else z
+
+    def exponential(self, scale=1.0, size=None):
+        # -log(1-U): com U e 1-U ficam -log(1-U) e -log(U), negativamente correlacionadas
+        return -scale * np.log1p(-self.random(size))
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return low + (high - low) * self.random(size)
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return loc + scale * self.standard_normal(size)
+
+    def gamma(self, shape, scale=1.0, size=None):
+        # A gama não tem inversa fechada: usa o gerador base (sem par antitético)
+        return self._rng.gamma(shape, scale, size)
+
+    def integers(self, low, high=None, size=None, dtype=np.int64):
+        if high is None: low, high = 0, low
+        return (low + np.floor(self.random(size) * (high - low))).astype(dtype)
+
+
+def criar_fluxos(seed, amostragem: Optional[str] = "direta") -> Dict[str, object]:
+    """Um gerador por fluxo (chegadas, serviço, triagem), todos derivados da mesma seed."""
+    if amostragem is None: amostragem = "direta"
+    if amostragem not in AMOSTRAGENS:
+        raise ValueError(f"Amostragem desconhecida: {amostragem} (use {', '.join(AMOSTRAGENS)})")
+    filhos = np.random.SeedSequence(seed).spawn(len(FLUXOS))
+    fluxos = {}
+    for nome, ss in zip(FLUXOS, filhos):
+        rng = np.random.default_rng(ss)
+        fluxos[nome] = rng if amostragem == "direta" else GeradorInversao(rng, amostragem == "antitetica")
+    return fluxos
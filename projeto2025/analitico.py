@@ -0,0 +1,101 @@
+import math
+from typing import Any, Dict, Optional
+
+from triagem import FALLBACK_ESP
+
+# Fórmulas fechadas da fila M/M/c (Erlang C). Valem para chegadas de Poisson homogéneas,
+# consultas exponenciais e médicos todos iguais (todos de clínica geral, que atendem
+# qualquer fila); as prioridades não mudam as médias globais porque a disciplina não
+# interrompe consultas e todos os doentes têm a mesma duração média. São médias em regime
+# estacionário, só definidas com utilização < 1.
+
+
+def erlang_c(servidores: int, carga: float) -> float:
+    """Probabilidade de esperar (Erlang C) com `servidores` e carga oferecida `carga` = λ/μ."""
+    if servidores <= 0: return 1.0
+    if carga <= 0: return 0.0
+    if carga >= servidores: return 1.0
+    # Erlang B pela recorrência estável B(k) = a·B(k-1) / (k + a·B(k-1))
+    b = 1.0
+    for k in range(1, servidores + 1):
+        b = carga * b / (k + carga * b)
+    rho = carga / servidores
+    return b / (1.0 - rho * (1.0 - b))
+
+
+def mmc(lambda_rate: float, num_doctors: int, mean_service_time: float) -> Dict[str, Any]:
+    """Métricas M/M/c em regime estacionário, nas unidades da simulação.
+
+    lambda_rate em chegadas por hora, mean_service_time em minutos; os tempos saem em
+    minutos e a ocupação em percentagem, com os mesmos nomes de calcular_estatisticas.
+    """
+    lam = float(lambda_rate) / 60.0          # chegadas por minuto
+    mu = 1.0 / float(mean_service_time)      # consultas por minuto e por médico
+    c = int(num_doctors)
+    carga = lam / mu
+    rho = carga / c if c > 0 else math.inf
+    estavel = rho < 1.0
+    res = {"lambda_rate": float(lambda_rate), "num_doctors": c, "mean_service_time": float(mean_service_time),
+           "carga": carga, "utilizacao": rho, "estavel": estavel}
+    if not estavel:
+        res.update(prob_espera=1.0, fila_media=math.inf, tempo_medio_espera=math.inf,
+                   tempo_medio_na_clinica=math.inf, ocupacao_media_medicos=100.0)
+        return res
+    pw = erlang_c(c, carga)
+    lq = pw * rho / (1.0 - rho)
+    wq = lq / lam if lam > 0 else 0.0
+    res.update(prob_espera=pw, fila_media=lq, tempo_medio_espera=wq,
+               tempo_medio_na_clinica=wq + float(mean_service_time), ocupacao_media_medicos=100.0 * rho)
+    return res
+
+
+def quantil_espera(p: float, lambda_rate: float, num_doctors: int, mean_service_time: float) -> float:
+    """Quantil p do tempo de espera (minutos): P(W > t) = C·exp(-(cμ-λ)t)."""
+    m = mmc(lambda_rate, num_doctors, mean_service_time)
+    if not m["estavel"]: return math.inf
+    if m["prob_espera"] <= 1.0 - p: return 0.0
+    taxa = num_doctors / float(mean_service_time) - float(lambda_rate) / 60.0
+    return math.log(m["prob_espera"] / (1.0 - p)) / taxa
+
+
+def aplica_analitico(params: Dict[str, Any]) -> bool:
+    """Os parâmetros da simulação correspondem a uma M/M/c (ver nota no topo)?"""
+    if params.get("service_distribution", "exponential") not in ("exponential", "exponencial"):
+        return False
+    if params.get("arrival_pattern") == "nao homogeneo" or params.get("fonte_chegadas") is not None:
+        return False
+    if params.get("medias_especialidade") or params.get("fatores_prioridade"):
+        return False
+    especialidades = params.get("doctor_specialties") or {}
+    n = int(params.get("num_doctors", 3))
+    return all(especialidades.get(str(i), FALLBACK_ESP) == FALLBACK_ESP for i in range(n))
+
+
+def mmc_de(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Métricas analíticas de um dicionário de parâmetros da simulação, ou None se não se aplicar
+    if not aplica_analitico(params): return None
+    return mmc(params.get("lambda_rate", 10), params.get("num_doctors", 3), params.get("mean_service_time", 15))
+
+
+def verificar_simulacao(estatisticas: Dict[str, Any], params: Dict[str, Any],
+                        tolerancia: float = 0.25) -> Optional[Dict[str, Any]]:
+    """Compara as estatísticas de uma corrida com a M/M/c equivalente (verificação de sanidade).
+
+    Devolve, por métrica, o valor analítico, o simulado e o desvio relativo, e "suspeito"
+    quando algum desvio passa a tolerância. Horizontes curtos começam com a clínica vazia
+    e ficam naturalmente abaixo do regime estacionário; o teste faz sentido em corridas
+    longas (ou depois de cortar o aquecimento).
+    """
+    ref = mmc_de(params)
+    if ref is None or not ref["estavel"]: return None
+    res: Dict[str, Any] = {"metricas": {}}
+    suspeito = False
+    for m in ("fila_media", "tempo_medio_espera", "tempo_medio_na_clinica", "ocupacao_media_medicos"):
+        if m not in estatisticas: continue
+        a = ref[m]; s = float(estatisticas[m])
+        # Desvio relativo ao maior dos dois (filas quase vazias não dão desvios enormes)
+        desvio = abs(s - a) / max(abs(a), abs(s), 1e-9)
+        res["metricas"][m] = {"analitico": a, "simulado": s, "desvio_relativo": desvio}
+        suspeito = suspeito or desvio > tolerancia
+    res["suspeito"] = suspeito
+    return res
@@ -0,0 +1,36 @@
+"""Compara o AmostradorServico com gera_tempo_consulta (velocidade e distribuição).
+
+Uso: python benchmark_servico.py [num_consultas]
+"""
+import sys
+import time
+
+import numpy as np
+
+from simulacao import gera_tempo_consulta
+from servico import AmostradorServico
+
+
+def comparar(distribuicao: str, media: float, n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+    antigo = np.array([gera_tempo_consulta(media, distribuicao, rng) for _ in range(n)])
+    t_antigo = time.perf_counter() - t0
+
+    amostrador = AmostradorServico(distribuicao, media, np.random.default_rng(seed + 1))
+    t0 = time.perf_counter()
+    novo = np.array([amostrador.proximo() for _ in range(n)])
+    t_novo = time.perf_counter() - t0
+
+    # As duas amostras devem vir da mesma distribuição: médias, desvios e quantis próximos
+    q = [10, 50, 90, 99]
+    print(f"{distribuicao:12s} antigo {t_antigo * 1e6 / n:6.2f} us/consulta | novo {t_novo * 1e6 / n:6.2f} us/consulta "
+          f"| x{t_antigo / t_novo:4.1f}")
+    print(f"{'':12s} media {antigo.mean():7.3f} vs {novo.mean():7.3f} | desvio {antigo.std():7.3f} vs {novo.std():7.3f} "
+          f"| p{q} {np.percentile(antigo, q).round(2)} vs {np.percentile(novo, q).round(2)}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for d in ("exponential", "normal", "uniform"):
+        comparar(d, 15.0, n)
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from simulacao import (CAMPOS_DETALHE, Paciente, iterar_array_json, _e_medico, _rng_carregamento,
+                       carregar_pacientes_json, distrito_de, texto_triagem)
+
+# Formato da cache (mudar sempre que as colunas ou a triagem pré-calculada mudarem)
+VERSAO_CACHE = 3
+
+# Colunas de texto guardadas em .npy de largura fixa (abertas com mmap)
+COLUNAS_TEXTO = ["id", "cc_bi", "nome", "profissao", "sexo", "distrito", "doenca"]
+# Os CAMPOS_DETALHE (que a simulação não usa) ficam num ficheiro de linhas JSON lido a pedido
+
+
+def pasta_cache(ficheiro: str) -> str:
+    # A cache fica ao lado do dataset: pessoas.json -> pessoas.json.cache/
+    return ficheiro + ".cache"
+
+
+def _hash_ficheiro(ficheiro: str, tam_bloco: int = 1 << 22) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(ficheiro, "rb") as f:
+        for bloco in iter(lambda: f.read(tam_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _assinatura(ficheiro: str) -> Dict[str, Any]:
+    st = os.stat(ficheiro)
+    return {"versao": VERSAO_CACHE, "mtime_ns": st.st_mtime_ns, "tamanho": st.st_size}
+
+
+def cache_valida(ficheiro: str) -> bool:
+    """A cache corresponde ao ficheiro atual (mesma versão, tamanho e mtime ou conteúdo)."""
+    meta_path = os.path.join(pasta_cache(ficheiro), "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    atual = _assinatura(ficheiro)
+    if meta.get("versao") != atual["versao"] or meta.get("tamanho") != atual["tamanho"]:
+        return False
+    if meta.get("mtime_ns") == atual["mtime_ns"]:
+        return True
+    # Ficheiro tocado ou copiado (mtime diferente): só o hash do conteúdo decide
+    return meta.get("hash") == _hash_ficheiro(ficheiro)
+
+
+def construir_cache(ficheiro: str) -> int:
+    """Lê o JSON uma vez e escreve as colunas em `<ficheiro>.cache/`. Devolve o nº de pacientes."""
+    assinatura = _assinatura(ficheiro)
+    colunas: Dict[str, List[str]] = {c: [] for c in COLUNAS_TEXTO}
+    idades: List[int] = []; offsets = [0]
+
+    destino = pasta_cache(ficheiro)
+    tmp = destino + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with open(os.path.join(tmp, "detalhes.jsonl"), "wb") as det:
+        i = 0
+        for p in iterar_array_json(ficheiro):
+            if not _e_medico(p):
+                colunas["id"].append(str(p.get("id", f"p{i}")))
+                colunas["cc_bi"].append(str(p.get("CC") or p.get("BI") or p.get("cc") or "N/A"))
+                colunas["nome"].append(str(p.get("nome", f"Pessoa {i+1}")))
+                colunas["profissao"].append(str(p.get("profissao") or ""))
+                colunas["sexo"].append(str(p.get("sexo") or ""))
+                colunas["distrito"].append(distrito_de(p.get("morada")) or "")
+                idade = p.get("idade")
+                idades.append(int(idade) if isinstance(idade, (int, float)) else -1)
+
+                # Texto da triagem já extraído da descrição (vazio se precisar de fallback sorteado)
+                colunas["doenca"].append(texto_triagem(p.get("descrição")))
+
+                linha = json.dumps({k: p.get(k) for k in CAMPOS_DETALHE}, ensure_ascii=False).encode("utf-8")
+                det.write(linha + b"\n")
+                offsets.append(offsets[-1] + len(linha) + 1)
+            i += 1
+
+    for c in COLUNAS_TEXTO:
+        np.save(os.path.join(tmp, c + ".npy"), np.array(colunas[c], dtype=str))
+    np.save(os.path.join(tmp, "idade.npy"), np.array(idades, dtype=np.int32))
+    np.save(os.path.join(tmp, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    meta = dict(assinatura, hash=_hash_ficheiro(ficheiro), num_pacientes=len(idades))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(tmp, destino)
+    return len(idades)
+
+
+class PacientesCache(Sequence):
+    """Pacientes lidos das colunas da cache, pela ordem de uma permutação.
+
+    As colunas são abertas com mmap, por isso abrir um dataset grande não lê nem cria
+    nada por paciente: cada Paciente é construído no primeiro acesso e reutilizado nos
+    seguintes (a simulação guarda nele a prioridade da triagem).
+    """
+
+    def __init__(self, pasta: str, ordem: np.ndarray):
+        self._pasta = pasta
+        self._ordem = ordem
+        self._abrir()
+
+    def _abrir(self):
+        self._colunas = {c: np.load(os.path.join(self._pasta, c + ".npy"), mmap_mode="r")
+                         for c in COLUNAS_TEXTO + ["idade", "offsets"]}
+        caminho = os.path.join(self._pasta, "detalhes.jsonl")
+        self._detalhes = np.memmap(caminho, dtype=np.uint8, mode="r") if os.path.getsize(caminho) else None
+        self._objetos: Dict[int, Paciente] = {}
+
+    # Para os workers de sensibilidade: envia-se só a pasta e a ordem, não as colunas
+    def __getstate__(self):
+        return {"pasta": self._pasta, "ordem": self._ordem}
+
+    def __setstate__(self, estado):
+        self._pasta = estado["pasta"]; self._ordem = estado["ordem"]
+        self._abrir()
+
+    def __len__(self) -> int:
+        return int(self._ordem.size)
+
+    def linha(self, k: int) -> int:
+        # Posição do paciente k nas colunas da cache
+        return int(self._ordem[k])
+
+    def coluna(self, nome: str) -> np.ndarray:
+        # Uma coluna inteira pela ordem dos pacientes, sem construir nenhum Paciente
+        return self._colunas[nome][self._ordem]
+
+    def detalhes(self, linha: int) -> Dict[str, Any]:
+        off = self._colunas["offsets"]
+        a, b = int(off[linha]), int(off[linha + 1])
+        return json.loads(bytes(self._detalhes[a:b]).decode("utf-8"))
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[j] for j in range(*k.indices(len(self)))]
+        if k < 0: k += len(self)
+        if k < 0 or k >= len(self):
+            raise IndexError(k)
+        p = self._objetos.get(k)
+        if p is None:
+            p = self._construir(self.linha(k))
+            self._objetos[k] = p
+        return p
+
+    def _construir(self, linha: int) -> Paciente:
+        # Só as colunas quentes; o perfil é lido de detalhes.jsonl quando a ficha o pedir
+        col = self._colunas
+        idade = int(col["idade"][linha])
+        return Paciente(id=str(col["id"][linha]), cc_bi=str(col["cc_bi"][linha]), nome=str(col["nome"][linha]),
+                        idade=idade if idade >= 0 else None, profissao=str(col["profissao"][linha]) or None,
+                        sexo=str(col["sexo"][linha]) or None, distrito=str(col["distrito"][linha]) or None,
+                        doenca=str(col["doenca"][linha]), fonte=self, linha=linha)
+
+
+def abrir_cache(ficheiro: str, limite: Optional[int] = None,
+                rng: Optional[np.random.Generator] = None) -> PacientesCache:
+    pasta = pasta_cache(ficheiro)
+    n = int(np.load(os.path.join(pasta, "idade.npy"), mmap_mode="r").shape[0])
+    # Amostra e baralha como carregar_pacientes_json: os mesmos sorteios do mesmo gerador,
+    # por isso a mesma seed dá os mesmos pacientes pela mesma ordem nos dois caminhos
+    rng = _rng_carregamento(rng)
+    if limite is not None and limite < n:
+        # Reservatório vectorizado: a linha i (i >= limite) entra no lugar j ~ U[0, i] se j < limite;
+        # quando várias linhas caem no mesmo lugar fica a última
+        lugares = rng.integers(np.arange(limite + 1, n + 1))
+        linhas = np.arange(limite, n)[lugares < limite][::-1]
+        lugares = lugares[lugares < limite][::-1]
+        amostra = np.arange(limite)
+        lugares, ultima = np.unique(lugares, return_index=True)
+        amostra[lugares] = linhas[ultima]
+        ordem = amostra[rng.permutation(limite)]
+    else:
+        ordem = rng.permutation(n)
+    return PacientesCache(pasta, ordem)
+
+
+def carregar_pacientes(ficheiro: str, limite: Optional[int] = None, usar_cache: bool = True,
+                       rng: Optional[np.random.Generator] = None):
+    """Carrega os pacientes pela cache colunar, criando-a na primeira vez.
+
+    Se a cache não puder ser escrita (pasta só de leitura, por exemplo) lê o JSON como
+    carregar_pacientes_json. rng decide a amostra e a ordem dos pacientes (sem ele vêm
+    do módulo random global).
+    """
+    if not os.path.exists(ficheiro):
+        return []
+    if usar_cache:
+        try:
+            if not cache_valida(ficheiro):
+                construir_cache(ficheiro)
+            return abrir_cache(ficheiro, limite, rng)
+        except (OSError, ValueError) as e:
+            print(f"Cache indisponivel para {ficheiro} ({e}); a ler o JSON.", file=sys.stderr)
+    return carregar_pacientes_json(ficheiro, limite, rng)
@@ -0,0 +1,188 @@
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from simulacao import SimulacaoClinica
+from sensibilidade import capturar_ctrl_c, intervalo_confianca
+
+# Análise em regime estacionário: a clínica começa vazia, por isso as primeiras horas
+# enviesam as médias. Aqui corta-se esse período inicial (fixo ou detetado pelo MSER-5)
+# e os intervalos de confiança saem de médias por lotes de uma única corrida longa.
+
+NUM_LOTES = 20
+
+
+def mser(serie, lote: int = 5) -> int:
+    """Número de observações a descartar no início da série (regra MSER-m, por omissão m=5).
+
+    A série é agrupada em médias de `lote` observações e escolhe-se o corte d que minimiza
+    a variância das médias restantes dividida por (n - d); só se procura na primeira
+    metade para o corte não comer a série toda.
+    """
+    y = np.asarray(serie, dtype=float)
+    m = y.size // lote
+    if m < 4:
+        return 0
+    z = y[:m * lote].reshape(m, lote).mean(axis=1)
+    # Somas de z e de z² de cada corte até ao fim, todas de uma vez
+    s1 = np.cumsum(z[::-1])[::-1]
+    s2 = np.cumsum((z * z)[::-1])[::-1]
+    k = m - np.arange(m, dtype=float)
+    estat = (s2 - s1 * s1 / k) / (k * k)
+    d = int(np.argmin(estat[:m // 2 + 1]))
+    return d * lote
+
+
+def medias_lote(serie, num_lotes: int = NUM_LOTES) -> Tuple[float, float]:
+    """(média, meia-largura do IC a 95%) pelo método das médias por lotes.
+
+    As observações que sobram da divisão em lotes iguais são as mais antigas (as mais
+    próximas do período de aquecimento).
+    """
+    y = np.asarray(serie, dtype=float)
+    tam = y.size // num_lotes
+    if tam < 1:
+        return intervalo_confianca(y)
+    lotes = y[y.size - tam * num_lotes:].reshape(num_lotes, tam).mean(axis=1)
+    return intervalo_confianca(lotes)
+
+
+def _area_acumulada(tempos, valores, instantes) -> np.ndarray:
+    # Integral da função em escada de 0 até cada instante
+    t = np.asarray(tempos, dtype=float); v = np.asarray(valores, dtype=float)
+    x = np.asarray(instantes, dtype=float)
+    acum = np.concatenate(([0.0], np.cumsum(v[:-1] * np.diff(t))))
+    pos = np.clip(np.searchsorted(t, x, side="right") - 1, 0, t.size - 1)
+    return acum[pos] + v[pos] * np.maximum(x - t[pos], 0.0)
+
+
+def medias_lote_temporais(tempos, valores, inicio: float, fim: float,
+                          num_lotes: int = NUM_LOTES) -> Tuple[float, float]:
+    # Lotes de igual duração em [inicio, fim]; cada lote é a média temporal da função em escada
+    if fim <= inicio:
+        return float("nan"), float("nan")
+    limites = np.linspace(inicio, fim, num_lotes + 1)
+    area = _area_acumulada(tempos, valores, limites)
+    return intervalo_confianca(np.diff(area) / np.diff(limites))
+
+
+def analisar_estacionario(sim: SimulacaoClinica, aquecimento: Union[None, float, str] = "mser5",
+                          num_lotes: int = NUM_LOTES, ate: Optional[float] = None) -> Dict[str, Any]:
+    """Médias e ICs por médias de lotes de uma corrida, sem o período de aquecimento.
+
+    aquecimento: minutos a descartar, "mser5" para detetar o corte pela série das esperas,
+    ou None para usar a corrida inteira. ate: analisa só o troço [0, ate] (o estado que a
+    corrida tinha nesse instante, mesmo que já tenha avançado); por omissão é o horizonte.
+    """
+    col = sim._estado.colunas()
+    tch = col["chegada"]; tini = col["inicio"]; dur = col["duracao"]; tsai = col["saida"]
+    with np.errstate(invalid="ignore"):
+        ok = ~np.isnan(tini) & (tch > 0) & (dur > 0)
+        if ate is not None:
+            # Consultas começadas até `ate`; quem saiu depois conta com a saída prevista
+            ok &= tini <= ate
+            tsai = np.where(tsai <= ate, tsai, np.nan)
+    idx = np.flatnonzero(ok)
+    idx = idx[np.argsort(tch[idx], kind="stable")]  # série pela ordem de chegada
+    espera = tini[idx] - tch[idx]
+    clinica = np.where(np.isnan(tsai[idx]), espera + dur[idx], tsai[idx] - tch[idx])
+
+    # Numa corrida interrompida as médias temporais vão só até onde chegou
+    if ate is not None: fim = float(ate)
+    else: fim = float(sim.agora) if sim.interrompida else float(sim.simulation_time)
+    if aquecimento == "mser5":
+        d = mser(espera, 5)
+        if d == 0: corte = 0.0
+        else: corte = float(tch[idx[d]]) if d < idx.size else fim
+    else:
+        corte = float(aquecimento or 0.0)
+        d = int(np.searchsorted(tch[idx], corte, side="left"))
+
+    res: Dict[str, Any] = {"aquecimento": corte, "descartados": d, "observacoes": int(idx.size - d),
+                           "num_lotes": num_lotes, "horizonte": fim,
+                           # Sem pacientes suficientes as chegadas param antes do horizonte e o
+                           # fim da corrida é só a clínica a esvaziar (não é regime estacionário)
+                           "pacientes_esgotados": (len(sim._chegada) if ate is None else
+                                                   int(np.count_nonzero(tch < ate))) >= len(sim.pacientes)}
+    for nome, serie in (("tempo_medio_espera", espera[d:]), ("tempo_medio_na_clinica", clinica[d:])):
+        media, meia = medias_lote(serie, num_lotes)
+        res[nome] = media; res[nome + "_ic95"] = meia
+    media, meia = medias_lote_temporais(sim._timeline_fila_t, sim._timeline_fila_v, corte, fim, num_lotes)
+    res["fila_media"] = media; res["fila_media_ic95"] = meia
+    media, meia = medias_lote_temporais(sim._timeline_ocup_t, sim._timeline_ocup_v, corte, fim, num_lotes)
+    escala = 100.0 / max(1, sim.num_doctors)
+    res["ocupacao_media_medicos"] = media * escala; res["ocupacao_media_medicos_ic95"] = meia * escala
+    return res
+
+
+class _Paragem:
+    # O que run() consulta para parar: o pedido do utilizador ou o IC já ter convergido
+    def __init__(self, cancelar):
+        self.cancelar = cancelar
+        self.convergiu = False
+
+    def is_set(self) -> bool:
+        return self.convergiu or self.cancelar.is_set()
+
+
+def estimar_estacionario(pacientes, params: Dict[str, Any], epsilon: Optional[float] = None,
+                         metrica: str = "tempo_medio_espera", relativo: bool = False,
+                         aquecimento: Union[None, float, str] = "mser5", num_lotes: int = NUM_LOTES,
+                         seed: int = 0, horizonte_max: Optional[int] = None, cancelar=None) -> Dict[str, Any]:
+    """Corre até a meia-largura do IC de `metrica` ficar abaixo de `epsilon`.
+
+    Sem epsilon faz uma só corrida com o simulation_time de `params`. Com epsilon faz uma
+    única corrida até horizonte_max e analisa-a enquanto decorre, exatamente no
+    simulation_time de `params` e nos seus dobros (com `relativo` o critério é
+    meia-largura / média); a corrida pára no primeiro ponto em que o IC chega, por isso
+    o custo é o do horizonte final e não o da soma de corridas cada vez mais longas.
+    Pára também em horizonte_max ou quando se esgotam os pacientes (o resultado indica
+    se "convergiu"). Com Ctrl-C (ou `cancelar` marcado) devolve a análise da corrida
+    interrompida, com "interrompido": True.
+    """
+    params = {k: v for k, v in params.items() if k not in ("pacientes", "seed")}
+    horizonte = int(params.pop("simulation_time", 480))
+    limite = horizonte_max if horizonte_max is not None else horizonte * 64
+    cancelar = cancelar if cancelar is not None else threading.Event()
+    paragem = _Paragem(cancelar)
+    sim = SimulacaoClinica(pacientes=pacientes, seed=seed, simulation_time=max(horizonte, limite) if epsilon is not None
+                           else horizonte, **params)
+    controlo = {"proximo": float(horizonte), "tentativas": 0, "res": None}
+
+    def avaliar(res) -> bool:
+        meia = res[metrica + "_ic95"]
+        if relativo and res[metrica]:
+            meia = meia / abs(res[metrica])
+        return epsilon is not None and meia == meia and meia < epsilon
+
+    def pontos_controlo(tempo):
+        # Cada ponto já ultrapassado é analisado no seu instante exato: até lá as chegadas e
+        # consultas são as mesmas que uma corrida com esse horizonte teria
+        while (controlo["res"] is None and controlo["proximo"] <= tempo
+               and controlo["proximo"] < sim.simulation_time and not cancelar.is_set()):
+            controlo["tentativas"] += 1
+            res = analisar_estacionario(sim, aquecimento, num_lotes, ate=controlo["proximo"])
+            if avaliar(res) or res["pacientes_esgotados"]:
+                controlo["res"] = res
+                paragem.convergiu = True
+            controlo["proximo"] *= 2
+
+    with capturar_ctrl_c(cancelar):
+        # Verificações frequentes para a corrida não avançar muito além do ponto que convergiu
+        sim.run(progresso=(lambda _, tempo: pontos_controlo(tempo)) if epsilon is not None else None,
+                cancelar=paragem, verificar_cada=100)
+    if epsilon is not None and not sim.interrompida:
+        # Pontos entre a última verificação e o fim da corrida
+        pontos_controlo(float(sim.agora))
+    res = controlo["res"]
+    if res is None:
+        # Corrida até ao fim (ou interrompida): analisa até ao horizonte ou, se os pacientes
+        # acabaram antes, até a clínica esvaziar
+        controlo["tentativas"] += 1
+        ate = None if sim.interrompida else min(float(sim.simulation_time), float(sim.agora))
+        res = analisar_estacionario(sim, aquecimento, num_lotes, ate=ate)
+    res.update(convergiu=avaliar(res), tentativas=controlo["tentativas"], epsilon=epsilon, metrica=metrica)
+    if sim.interrompida and not paragem.convergiu:
+        res.update(interrompido=True, tempo_interrupcao=sim.agora)
+    return res
@@ -0,0 +1,279 @@
+import numpy as np
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+from filas import MAPA_PRIORIDADE
+
+# Identificadores "p1", "p2", ... usados nos dicionários: o paciente de índice i é "p{i+1}"
+def pid_str(pidx: int) -> str:
+    return f"p{pidx + 1}"
+
+def pid_idx(pid: str) -> int:
+    return int(pid[1:]) - 1
+
+
+class EstadoDicionarios:
+    """Estado por paciente em dicionários indexados pelo pid (modo por omissão)."""
+
+    def __init__(self, pacientes):
+        self.chegada: Dict[str, float] = {}
+        self.inicio: Dict[str, float] = {}
+        self.saida: Dict[str, float] = {}
+        self.duracao: Dict[str, float] = {}
+        self.pid_to_pidx: Dict[str, int] = {}
+        self.paciente_medico: Dict[str, int] = {}
+        self.prioridade: Dict[str, str] = {}
+        self.especialidade: Dict[str, str] = {}
+        self.eventos: List[Dict[str, Any]] = []
+        self._pacientes = pacientes
+
+    def registar_chegada(self, pidx: int, tempo: float):
+        pid = pid_str(pidx)
+        self.chegada[pid] = tempo
+        self.pid_to_pidx[pid] = pidx
+
+    def registar_triagem(self, pidx: int, prioridade: str, especialidade: str):
+        pid = pid_str(pidx)
+        self.prioridade[pid] = prioridade; self.especialidade[pid] = especialidade
+
+    def registar_inicio(self, pidx: int, tempo: float, duracao: float, medico: int):
+        pid = pid_str(pidx)
+        self.inicio[pid] = tempo; self.duracao[pid] = duracao
+        self.paciente_medico[pid] = medico
+
+    def registar_saida(self, pidx: int, tempo: float):
+        self.saida[pid_str(pidx)] = tempo
+
+    def chegada_de(self, pidx: int) -> Optional[float]:
+        return self.chegada.get(pid_str(pidx))
+
+    def medico_de(self, pidx: int) -> Optional[int]:
+        return self.paciente_medico.get(pid_str(pidx))
+
+    def registar_evento(self, minuto: int, duracao: float, medico: Optional[int], pidx: int, especialidade: str, motivo: str):
+        self.eventos.append({"minuto_inicio": minuto, "duracao": duracao, "medico": medico,
+                             "paciente": self._pacientes[pidx].nome, "especialidade": especialidade, "motivo": motivo})
+
+    def indice_consultas(self, num_medicos: int) -> "IndiceConsultas":
+        evs = self.eventos
+        return IndiceConsultas(np.fromiter((e["minuto_inicio"] for e in evs), dtype=np.float64, count=len(evs)),
+                               np.fromiter((e["duracao"] for e in evs), dtype=np.float64, count=len(evs)),
+                               np.fromiter((-1 if e["medico"] is None else e["medico"] for e in evs),
+                                           dtype=np.int64, count=len(evs)),
+                               num_medicos)
+
+    def tempos(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        espera = []; consulta = []; clinica = []
+        for pid, tini in self.inicio.items():
+            tch = self.chegada.get(pid); dur = self.duracao.get(pid)
+            if tch and dur:
+                espera.append(tini - tch)
+                consulta.append(dur)
+                tsai = self.saida.get(pid)
+                if tsai: clinica.append(tsai - tch)
+                else: clinica.append((tini - tch) + dur)
+        return np.asarray(espera, dtype=float), np.asarray(consulta, dtype=float), np.asarray(clinica, dtype=float)
+
+    def colunas(self) -> Dict[str, Any]:
+        # Mesmas colunas de EstadoCompacto, montadas a partir dos dicionários
+        n = len(self._pacientes)
+        col = {k: np.full(n, np.nan) for k in ("chegada", "inicio", "saida", "duracao")}
+        for k, d in (("chegada", self.chegada), ("inicio", self.inicio), ("saida", self.saida), ("duracao", self.duracao)):
+            if d:
+                col[k][[pid_idx(p) for p in d]] = list(d.values())
+        col["prioridade"] = np.full(n, -1, dtype=np.int8)
+        col["especialidade"] = np.full(n, -1, dtype=np.int16)
+        nomes: List[str] = []; codigos: Dict[str, int] = {}
+        for pid, prio in self.prioridade.items():
+            i = pid_idx(pid); esp = self.especialidade[pid]
+            col["prioridade"][i] = MAPA_PRIORIDADE.get(prio, 2)
+            col["especialidade"][i] = EstadoCompacto._codigo(esp, nomes, codigos)
+        col["nomes_especialidade"] = nomes
+        return col
+
+
+class IndiceConsultas:
+    """Consultas de cada médico em arrays ordenados, para saber quem está em consulta num minuto.
+
+    Os eventos de um médico entram por ordem de tempo e não se sobrepõem, por isso a
+    consulta ativa no minuto m é a última que começou até m, se ainda não acabou: uma
+    pesquisa binária por médico em vez de percorrer a lista de eventos toda.
+    """
+
+    def __init__(self, minutos, duracoes, medicos, num_medicos: int):
+        minutos = np.asarray(minutos, dtype=np.float64)
+        duracoes = np.asarray(duracoes, dtype=np.float64)
+        medicos = np.asarray(medicos, dtype=np.int64)
+        # Só os eventos de início de consulta (os de entrada na fila não têm médico)
+        sel = np.flatnonzero((medicos >= 0) & (medicos < num_medicos) & (duracoes > 0))
+        sel = sel[np.argsort(medicos[sel], kind="stable")]
+        limites = np.searchsorted(medicos[sel], np.arange(num_medicos + 1))
+        self._inicio: List[np.ndarray] = []; self._fim: List[np.ndarray] = []; self._evento: List[np.ndarray] = []
+        for m in range(num_medicos):
+            idx = sel[limites[m]:limites[m + 1]]
+            self._inicio.append(minutos[idx]); self._fim.append(minutos[idx] + duracoes[idx])
+            self._evento.append(idx)
+
+    def ativas(self, minuto: float) -> Dict[int, int]:
+        """{médico: posição do evento em `eventos`} das consultas a decorrer no minuto dado."""
+        res = {}
+        for m, inicio in enumerate(self._inicio):
+            k = int(np.searchsorted(inicio, minuto, side="right")) - 1
+            if k >= 0 and minuto < self._fim[m][k]:
+                res[m] = int(self._evento[m][k])
+        return res
+
+
+class VistaArray(Mapping):
+    """Vista só de leitura de uma coluna como dicionário {pid: valor}.
+
+    Só são visíveis as posições preenchidas (diferentes de NaN / -1), por isso a vista
+    comporta-se como os dicionários do modo normal sem criar um objeto por paciente.
+    """
+
+    def __init__(self, coluna: np.ndarray, valor_fn=None):
+        self._coluna = coluna
+        self._valor_fn = valor_fn
+
+    def _validos(self) -> np.ndarray:
+        if self._coluna.dtype.kind == "f":
+            return ~np.isnan(self._coluna)
+        return self._coluna >= 0
+
+    def __getitem__(self, pid):
+        try:
+            i = pid_idx(pid)
+        except (ValueError, TypeError, IndexError):
+            raise KeyError(pid)
+        if i < 0 or i >= self._coluna.size:
+            raise KeyError(pid)
+        v = self._coluna[i]
+        if (self._coluna.dtype.kind == "f" and np.isnan(v)) or (self._coluna.dtype.kind != "f" and v < 0):
+            raise KeyError(pid)
+        return self._valor_fn(i, v) if self._valor_fn else v.item()
+
+    def __iter__(self):
+        return (pid_str(int(i)) for i in np.flatnonzero(self._validos()))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._validos()))
+
+
+class VistaEventos(Sequence):
+    """Lista de eventos reconstruída a pedido a partir das colunas de EstadoCompacto."""
+
+    def __init__(self, estado: "EstadoCompacto"):
+        self._estado = estado
+
+    def __len__(self) -> int:
+        return self._estado.num_eventos
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0: i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        e = self._estado
+        medico = int(e.ev_medico[i])
+        return {"minuto_inicio": int(e.ev_minuto[i]), "duracao": float(e.ev_duracao[i]),
+                "medico": medico if medico >= 0 else None,
+                "paciente": e._pacientes[int(e.ev_pidx[i])].nome,
+                "especialidade": e.nomes_especialidade[int(e.ev_esp[i])],
+                "motivo": e.nomes_motivo[int(e.ev_motivo[i])]}
+
+
+class EstadoCompacto:
+    """Estado por paciente em colunas NumPy pré-alocadas e indexadas pelo índice do paciente.
+
+    Cada paciente chega no máximo uma vez e gera no máximo dois eventos (entrada na fila
+    e início da consulta), por isso os tamanhos são conhecidos antes do ciclo começar.
+    As especialidades e os motivos ficam guardados como códigos numa tabela pequena.
+    """
+
+    def __init__(self, pacientes):
+        n = len(pacientes)
+        self._pacientes = pacientes
+        self.col_chegada = np.full(n, np.nan)
+        self.col_inicio = np.full(n, np.nan)
+        self.col_saida = np.full(n, np.nan)
+        self.col_duracao = np.full(n, np.nan)
+        self.col_medico = np.full(n, -1, dtype=np.int32)
+        self.col_prioridade = np.full(n, -1, dtype=np.int8)
+        self.col_especialidade = np.full(n, -1, dtype=np.int16)
+        self.ev_minuto = np.zeros(2 * n, dtype=np.int32)
+        self.ev_duracao = np.zeros(2 * n)
+        self.ev_medico = np.full(2 * n, -1, dtype=np.int32)
+        self.ev_pidx = np.zeros(2 * n, dtype=np.int32)
+        self.ev_esp = np.zeros(2 * n, dtype=np.int16)
+        self.ev_motivo = np.zeros(2 * n, dtype=np.int32)
+        self.num_eventos = 0
+        self.nomes_especialidade: List[str] = []; self._cod_especialidade: Dict[str, int] = {}
+        self.nomes_motivo: List[str] = []; self._cod_motivo: Dict[str, int] = {}
+
+        # Vistas com a mesma interface dos dicionários do modo normal (usadas pela GUI)
+        self.chegada = VistaArray(self.col_chegada)
+        self.inicio = VistaArray(self.col_inicio)
+        self.saida = VistaArray(self.col_saida)
+        self.duracao = VistaArray(self.col_duracao)
+        self.pid_to_pidx = VistaArray(self.col_chegada, lambda i, v: i)
+        self.paciente_medico = VistaArray(self.col_medico)
+        self.eventos = VistaEventos(self)
+
+    @staticmethod
+    def _codigo(nome: str, nomes: List[str], codigos: Dict[str, int]) -> int:
+        c = codigos.get(nome)
+        if c is None:
+            c = len(nomes); codigos[nome] = c; nomes.append(nome)
+        return c
+
+    def registar_chegada(self, pidx: int, tempo: float):
+        self.col_chegada[pidx] = tempo
+
+    def registar_triagem(self, pidx: int, prioridade: str, especialidade: str):
+        self.col_prioridade[pidx] = MAPA_PRIORIDADE.get(prioridade, 2)
+        self.col_especialidade[pidx] = self._codigo(especialidade, self.nomes_especialidade, self._cod_especialidade)
+
+    def registar_inicio(self, pidx: int, tempo: float, duracao: float, medico: int):
+        self.col_inicio[pidx] = tempo; self.col_duracao[pidx] = duracao
+        self.col_medico[pidx] = medico
+
+    def registar_saida(self, pidx: int, tempo: float):
+        self.col_saida[pidx] = tempo
+
+    def chegada_de(self, pidx: int) -> Optional[float]:
+        t = float(self.col_chegada[pidx])
+        return None if np.isnan(t) else t
+
+    def medico_de(self, pidx: int) -> Optional[int]:
+        m = int(self.col_medico[pidx])
+        return m if m >= 0 else None
+
+    def registar_evento(self, minuto: int, duracao: float, medico: Optional[int], pidx: int, especialidade: str, motivo: str):
+        k = self.num_eventos
+        self.ev_minuto[k] = minuto; self.ev_duracao[k] = duracao
+        self.ev_medico[k] = -1 if medico is None else medico
+        self.ev_pidx[k] = pidx
+        self.ev_esp[k] = self._codigo(especialidade, self.nomes_especialidade, self._cod_especialidade)
+        self.ev_motivo[k] = self._codigo(motivo, self.nomes_motivo, self._cod_motivo)
+        self.num_eventos = k + 1
+
+    def indice_consultas(self, num_medicos: int) -> "IndiceConsultas":
+        k = self.num_eventos
+        return IndiceConsultas(self.ev_minuto[:k], self.ev_duracao[:k], self.ev_medico[:k], num_medicos)
+
+    def tempos(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Mesma seleção do modo normal (chegada e duração não nulas), pela ordem de início
+        ok = ~np.isnan(self.col_inicio) & (self.col_chegada > 0) & (self.col_duracao > 0)
+        idx = np.flatnonzero(ok)
+        idx = idx[np.argsort(self.col_inicio[idx], kind="stable")]
+        tch = self.col_chegada[idx]; tini = self.col_inicio[idx]; dur = self.col_duracao[idx]
+        tsai = self.col_saida[idx]
+        espera = tini - tch
+        clinica = np.where(np.isnan(tsai), espera + dur, tsai - tch)
+        return espera, dur, clinica
+
+    def colunas(self) -> Dict[str, Any]:
+        return {"chegada": self.col_chegada, "inicio": self.col_inicio, "saida": self.col_saida,
+                "duracao": self.col_duracao, "prioridade": self.col_prioridade,
+                "especialidade": self.col_especialidade, "nomes_especialidade": list(self.nomes_especialidade)}
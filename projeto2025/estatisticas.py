@@ -0,0 +1,223 @@
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Quantis do tempo de espera em calcular_estatisticas (espera_p50, espera_p90, espera_p99)
+QUANTIS_ESPERA = (0.5, 0.9, 0.99)
+
+
+class Welford:
+    """Média, variância, mínimo e máximo numa só passagem (algoritmo de Welford)."""
+
+    __slots__ = ("n", "media", "_m2", "minimo", "maximo")
+
+    def __init__(self):
+        self.n = 0; self.media = 0.0; self._m2 = 0.0
+        self.minimo = math.inf; self.maximo = -math.inf
+
+    def adicionar(self, x: float):
+        self.n += 1
+        d = x - self.media
+        self.media += d / self.n
+        self._m2 += d * (x - self.media)
+        if x < self.minimo: self.minimo = x
+        if x > self.maximo: self.maximo = x
+
+    @property
+    def variancia(self) -> float:
+        # Variância da população (como np.var), 0 com menos de duas observações
+        return self._m2 / self.n if self.n > 1 else 0.0
+
+
+class MediaTemporal:
+    """Média ponderada pelo tempo de uma função em escada em [0, horizonte].
+
+    Cada mudança de valor acumula a área do degrau anterior; a média pode ser lida a meio
+    da simulação (até ao instante atual).
+    """
+
+    __slots__ = ("horizonte", "valor", "maximo", "_t", "_area")
+
+    def __init__(self, horizonte: float):
+        self.horizonte = float(horizonte)
+        self.valor = 0; self.maximo = 0
+        self._t = 0.0; self._area = 0.0
+
+    def _acumular(self, tempo: float):
+        t = min(tempo, self.horizonte)
+        if t > self._t:
+            self._area += self.valor * (t - self._t)
+            self._t = t
+
+    def atualizar(self, tempo: float, valor):
+        self._acumular(tempo)
+        self.valor = valor
+        if tempo < self.horizonte and valor > self.maximo:
+            self.maximo = valor
+
+    def media(self, ate: Optional[float] = None) -> float:
+        fim = self.horizonte if ate is None else min(float(ate), self.horizonte)
+        if fim <= 0: return 0.0
+        area = self._area + (self.valor * (fim - self._t) if fim > self._t else 0.0)
+        return area / fim
+
+
+class QuantisLog:
+    """Quantis de uma série de valores >= 0 numa só passagem, com erro relativo limitado.
+
+    As primeiras `exatas` observações ficam guardadas e os quantis saem exatos (como
+    np.percentile); a partir daí cada valor só conta num balde logarítmico de largura
+    relativa ~2·erro e o quantil é o centro do balde onde cai, com erro relativo até
+    `erro` seja qual for a ordem dos valores. A memória não cresce com o número de
+    observações: há um balde por cada fator (1+erro)/(1-erro) entre o menor e o maior valor.
+    """
+
+    __slots__ = ("erro", "exatas", "minimo", "n", "_buffer", "_log_gama", "_gama", "_zeros", "_baldes")
+
+    def __init__(self, erro: float = 0.005, exatas: int = 1000, minimo: float = 1e-6):
+        self.erro = float(erro); self.exatas = int(exatas); self.minimo = float(minimo)
+        self.n = 0
+        self._buffer: Optional[List[float]] = []
+        self._gama = (1 + self.erro) / (1 - self.erro); self._log_gama = math.log(self._gama)
+        self._zeros = 0
+        self._baldes: Dict[int, int] = {}
+
+    def adicionar(self, x: float):
+        self.n += 1
+        if self._buffer is None:
+            self._contar(x)
+            return
+        self._buffer.append(x)
+        if len(self._buffer) > self.exatas:
+            for v in self._buffer: self._contar(v)
+            self._buffer = None
+
+    def _contar(self, x: float):
+        # Valores até `minimo` (esperas nulas) contam à parte; o balde k cobre (γ^(k-1), γ^k]
+        if x <= self.minimo:
+            self._zeros += 1
+        else:
+            k = math.ceil(math.log(x) / self._log_gama)
+            self._baldes[k] = self._baldes.get(k, 0) + 1
+
+    def quantil(self, p: float) -> float:
+        if self._buffer is not None:
+            return float(np.percentile(self._buffer, 100 * p)) if self._buffer else 0.0
+        ordem = p * (self.n - 1)   # posição (a contar de 0) do quantil, como em np.percentile
+        vistos = self._zeros
+        if ordem < vistos: return 0.0
+        for k in sorted(self._baldes):
+            vistos += self._baldes[k]
+            if ordem < vistos:
+                return 2.0 * self._gama ** k / (self._gama + 1.0)
+        return 2.0 * self._gama ** max(self._baldes) / (self._gama + 1.0)
+
+
+class AcumuladorEstatisticas:
+    """Estatísticas da simulação atualizadas dentro do ciclo de eventos.
+
+    Guarda só somas e os baldes dos quantis da espera (memória O(médicos)), por isso
+    serve horizontes longos e pode ser consultado a meio da corrida. calcular_estatisticas
+    monta a partir daqui o dicionário de resultados.
+    """
+
+    def __init__(self, num_medicos: int, horizonte: float):
+        self.horizonte = float(horizonte)
+        self.espera = Welford(); self.consulta = Welford(); self.clinica = Welford()
+        self.quantis = QuantisLog()
+        self.fila = MediaTemporal(horizonte)
+        self.ocupados = MediaTemporal(horizonte)
+        self.num_atendidos = [0] * num_medicos
+        self.tempo_consulta = [0.0] * num_medicos
+        self.doentes_atendidos = 0
+
+    def registar_consulta(self, medico: int, chegada: float, inicio: float, duracao: float):
+        self.num_atendidos[medico] += 1
+        self.tempo_consulta[medico] += duracao
+        # Mesma seleção de Estado*.tempos(): chegada e duração não nulas
+        if chegada and duracao:
+            espera = inicio - chegada
+            self.espera.adicionar(espera)
+            self.quantis.adicionar(espera)
+            self.consulta.adicionar(duracao)
+            self.clinica.adicionar(espera + duracao)
+
+    def quantis_espera(self) -> Dict[str, float]:
+        return {f"espera_p{int(round(q * 100))}": self.quantis.quantil(q) for q in QUANTIS_ESPERA}
+
+    def registar_saida(self):
+        self.doentes_atendidos += 1
+
+    def registar_fila(self, tempo: float, tamanho: int):
+        self.fila.atualizar(tempo, tamanho)
+
+    def registar_ocupados(self, tempo: float, ocupados: int):
+        self.ocupados.atualizar(tempo, ocupados)
+
+
+# --- MÉTRICAS DE CAUDA (POR PRIORIDADE E ESPECIALIDADE) ---
+PERCENTIS_CAUDA = (50, 90, 95, 99)
+NOMES_PRIORIDADE = {0: "urgente", 1: "moderada", 2: "normal"}
+
+
+def _resumo_cauda(valores: np.ndarray, percentis) -> Dict[str, float]:
+    res = {"media": float(valores.mean()), "max": float(valores.max())}
+    for p, v in zip(percentis, np.percentile(valores, percentis)):
+        res[f"p{p}"] = float(v)
+    return res
+
+
+def _por_grupo(chave: np.ndarray, espera: np.ndarray, clinica: np.ndarray, nomes, percentis,
+               limites_espera: np.ndarray, limites_clinica: np.ndarray) -> Dict[str, Any]:
+    # Ordena uma vez pela chave do grupo e parte os arrays nos limites de cada grupo
+    ordem = np.argsort(chave, kind="stable")
+    chaves, inicios = np.unique(chave[ordem], return_index=True)
+    grupos = {}
+    for k, esp_g, cli_g in zip(chaves, np.split(espera[ordem], inicios[1:]), np.split(clinica[ordem], inicios[1:])):
+        grupos[nomes(int(k))] = {
+            "n": int(esp_g.size),
+            "espera": _resumo_cauda(esp_g, percentis),
+            "clinica": _resumo_cauda(cli_g, percentis),
+            "histograma_espera": np.histogram(esp_g, bins=limites_espera)[0].tolist(),
+            "histograma_clinica": np.histogram(cli_g, bins=limites_clinica)[0].tolist(),
+        }
+    return grupos
+
+
+def metricas_cauda(colunas: Dict[str, Any], percentis=PERCENTIS_CAUDA, num_classes: int = 20) -> Dict[str, Any]:
+    """Percentis e histogramas da espera e do tempo na clínica por prioridade e especialidade.
+
+    Trabalha sobre as colunas por paciente do estado da simulação (Estado*.colunas()), com a
+    mesma seleção de pacientes das médias. Os histogramas de todos os grupos usam os mesmos
+    limites, por isso podem ser comparados diretamente.
+    """
+    tch = colunas["chegada"]; tini = colunas["inicio"]; dur = colunas["duracao"]; tsai = colunas["saida"]
+    with np.errstate(invalid="ignore"):
+        ok = ~np.isnan(tini) & (tch > 0) & (dur > 0)
+    tch, tini, dur, tsai = tch[ok], tini[ok], dur[ok], tsai[ok]
+    prio = colunas["prioridade"][ok].astype(np.int64)
+    esp = colunas["especialidade"][ok].astype(np.int64)
+    nomes_esp = colunas["nomes_especialidade"]
+
+    espera = tini - tch
+    clinica = np.where(np.isnan(tsai), espera + dur, tsai - tch)
+    res: Dict[str, Any] = {"percentis": list(percentis), "n": int(espera.size)}
+    if espera.size == 0:
+        res.update(limites_espera=[], limites_clinica=[], por_prioridade={}, por_especialidade={},
+                   por_prioridade_especialidade={})
+        return res
+
+    lim_espera = np.linspace(0.0, max(float(espera.max()), 1e-9), num_classes + 1)
+    lim_clinica = np.linspace(0.0, max(float(clinica.max()), 1e-9), num_classes + 1)
+    nome_prio = lambda k: NOMES_PRIORIDADE.get(k, str(k))
+    nome_esp = lambda k: nomes_esp[k] if 0 <= k < len(nomes_esp) else "?"
+    base = max(1, len(nomes_esp))
+    res["limites_espera"] = lim_espera.tolist()
+    res["limites_clinica"] = lim_clinica.tolist()
+    res["por_prioridade"] = _por_grupo(prio, espera, clinica, nome_prio, percentis, lim_espera, lim_clinica)
+    res["por_especialidade"] = _por_grupo(esp, espera, clinica, nome_esp, percentis, lim_espera, lim_clinica)
+    res["por_prioridade_especialidade"] = _por_grupo(
+        prio * base + esp, espera, clinica,
+        lambda k: f"{nome_prio(k // base)}/{nome_esp(k % base)}", percentis, lim_espera, lim_clinica)
+    return res
@@ -0,0 +1,97 @@
+import heapq
+import itertools
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Mapa: Urgente(0) > Moderada(1) > Normal(2)
+MAPA_PRIORIDADE = {"urgente": 0, "moderada": 1, "normal": 2}
+
+
+class FilaPrioridade:
+    """Sala de espera de uma especialidade.
+
+    Guarda pares (prioridade, ordem de chegada) num heap, por isso inserir e retirar
+    custam O(log n) e o tamanho O(1). Para a mesma prioridade sai primeiro quem chegou
+    primeiro, tal como o sort estável que era feito a cada chegada.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, Any]] = []
+        self._seq = itertools.count()
+
+    def append(self, pid, prioridade="normal"):
+        val = prioridade if isinstance(prioridade, int) else MAPA_PRIORIDADE.get(prioridade, 2)
+        heapq.heappush(self._heap, (val, next(self._seq), pid))
+
+    def pop(self, index: int = 0):
+        # O argumento existe apenas para aceitar o antigo "pop(0)": retira sempre a cabeça.
+        if index != 0:
+            raise IndexError("FilaPrioridade só permite retirar a cabeça da fila")
+        if not self._heap:
+            raise IndexError("pop de uma fila vazia")
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return len(self._heap) > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        # Percorre pela ordem de atendimento (cópia ordenada, não altera o heap)
+        return (item[2] for item in sorted(self._heap))
+
+    def __repr__(self):
+        return f"FilaPrioridade({len(self._heap)} em espera)"
+
+
+class PoolMedicosLivres:
+    """Médicos livres agrupados por especialidade.
+
+    Cada especialidade tem um heap de índices, por isso o médico escolhido é sempre o de
+    menor índice (como no varrimento antigo de _medicos) e ocupar/libertar custa O(log n).
+    """
+
+    def __init__(self):
+        self._livres: Dict[str, List[int]] = {}
+
+    def libertar(self, idx: int, especialidade: str):
+        heapq.heappush(self._livres.setdefault(especialidade, []), idx)
+
+    def ocupar(self, especialidade: str) -> Optional[int]:
+        heap = self._livres.get(especialidade)
+        if heap:
+            return heapq.heappop(heap)
+        return None
+
+
+class IndiceFilasNaoVazias:
+    """Índice das filas com doentes, pela ordem em que cada especialidade foi criada.
+
+    Serve o médico de clínica geral que vai ajudar noutras filas: em vez de percorrer
+    todas as chaves de _filas, consulta o heap e descarta à medida as filas que esvaziaram.
+    """
+
+    def __init__(self):
+        self._ordem: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+        self._marcadas = set()
+
+    def registar(self, especialidade: str):
+        if especialidade not in self._ordem:
+            self._ordem[especialidade] = len(self._ordem)
+
+    def marcar(self, especialidade: str):
+        # Chamado sempre que entra alguém na fila; só entra no heap se ainda lá não estiver
+        if especialidade not in self._marcadas:
+            self.registar(especialidade)
+            heapq.heappush(self._heap, (self._ordem[especialidade], especialidade))
+            self._marcadas.add(especialidade)
+
+    def primeira(self, filas: Dict[str, FilaPrioridade]) -> Optional[str]:
+        while self._heap:
+            esp = self._heap[0][1]
+            if filas.get(esp):
+                return esp
+            heapq.heappop(self._heap)
+            self._marcadas.discard(esp)
+        return None
@@ -2,13 +2,20 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import numpy as np
 import threading
+import time
 import traceback
+import queue
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
 import random
 from collections import Counter
-from simulacao import SimulacaoClinica, carregar_pacientes_json, calcular_estatisticas
+from simulacao import SimulacaoClinica
+from cache_pacientes import carregar_pacientes
+from triagem import TRIAGEM
+from sensibilidade import varrimento
+from analitico import aplica_analitico, mmc
+from pesquisa import IndicePacientes
 
 # --- PALETA DE CORES "PROFESSIONAL DARK" ---
 COLOR_SIDEBAR_BG = "#2c3e50"    # Azul Petróleo Escuro
@@ -24,6 +31,9 @@ FONT_SUBTITLE = ("Segoe UI", 11, "bold")
 FONT_BODY = ("Segoe UI", 9)
 FONT_MONO = ("Consolas", 9)
 
+# Linhas mostradas numa pesquisa de utentes (o total encontrado aparece no título)
+MAX_RESULTADOS_PESQUISA = 500
+
 # --- FUNÇÕES GRÁFICAS ---
 
 def embed_plot_on_frame(frame, fig):
@@ -105,10 +115,21 @@ def grafico_fila_frame(frame, dados):
     fig.tight_layout()
     return embed_plot_on_frame(frame, fig)
 
-def grafico_fila_vs_taxa_frame(frame, taxas, medias):
+def grafico_fila_vs_taxa_frame(frame, taxas, medias, erros=None, analitico=None):
+    # `analitico`: (taxas, filas) da fórmula M/M/c, desenhada como série à parte
     fig = plt.Figure(figsize=(6, 4), dpi=90)
     ax = fig.add_subplot(111)
-    ax.plot(taxas, medias, marker='s', color='#2980b9', linewidth=2)
+    if taxas and erros is not None:
+        # Barras de erro = meia-largura do IC a 95% entre replicações
+        erros = [0 if e != e else e for e in erros]
+        ax.errorbar(taxas, medias, yerr=erros, marker='s', color='#2980b9', linewidth=2, capsize=4,
+                    label="Simulação (IC 95%)")
+    elif taxas:
+        ax.plot(taxas, medias, marker='s', color='#2980b9', linewidth=2, label="Simulação")
+    if analitico and analitico[0]:
+        ax.plot(*analitico, linestyle='--', marker='o', color='#c0392b', linewidth=1.5,
+                label="M/M/c (Erlang C)")
+        ax.legend()
     ax.grid(True, linestyle='--', alpha=0.6)
     ax.set_title("Sensibilidade: Impacto da Taxa (λ)")
     ax.set_xlabel("Taxa de Chegada")
@@ -134,6 +155,36 @@ def grafico_ocupacao_medicos_bar(frame, med_stats):
     fig.tight_layout()
     return embed_plot_on_frame(frame, fig)
 
+def grafico_cauda_frame(frame, cauda):
+    # Percentis da espera por prioridade (em cima) e p95 por especialidade (em baixo)
+    fig = plt.Figure(figsize=(6, 5), dpi=90)
+    ax1 = fig.add_subplot(211); ax2 = fig.add_subplot(212)
+    por_prio = (cauda or {}).get("por_prioridade", {})
+    if por_prio:
+        percentis = cauda["percentis"]
+        prios = [p for p in ("urgente", "moderada", "normal") if p in por_prio]
+        largura = 0.8 / len(percentis)
+        cores = ['#27ae60', '#f39c12', '#e67e22', COLOR_BTN_DANGER]
+        for j, pct in enumerate(percentis):
+            xs = [k + (j - (len(percentis) - 1) / 2) * largura for k in range(len(prios))]
+            ax1.bar(xs, [por_prio[p]["espera"][f"p{pct}"] for p in prios], width=largura,
+                    color=cores[j % len(cores)], label=f"p{pct}")
+        ax1.set_xticks(range(len(prios)))
+        ax1.set_xticklabels([f"{p.capitalize()} (n={por_prio[p]['n']})" for p in prios], fontsize=8)
+        ax1.legend(fontsize=7)
+
+        por_esp = cauda["por_especialidade"]
+        esps = sorted(por_esp, key=lambda e: por_esp[e]["espera"]["p95"])
+        ax2.barh(esps, [por_esp[e]["espera"]["p95"] for e in esps], color='#8e44ad', alpha=0.8)
+        ax2.set_xlabel("Espera p95 (min)")
+        ax2.tick_params(axis='y', labelsize=8)
+    else:
+        ax1.text(0.5, 0.5, "Sem dados", ha='center')
+    ax1.set_title("Espera por Prioridade (percentis, min)", fontsize=10)
+    ax2.set_title("Espera p95 por Especialidade", fontsize=10)
+    fig.tight_layout()
+    return embed_plot_on_frame(frame, fig)
+
 # --- CLASSE DA APLICAÇÃO ---
 
 class App(tk.Tk):
@@ -150,9 +201,17 @@ class App(tk.Tk):
         self.sim = None
         self.anim_after = None
         self.minuto_atual = 0
+        self._cena = None
+        self._t_anim = None
+        self._ao_vivo = False
+        self._progresso = 0.0
+        self._cancelar = None       # pedido de paragem da simulação em curso
+        self._cancelar_comp = None  # e da análise de sensibilidade
         self.comp_data = None
+        self._plot_comp = None      # frame do gráfico de sensibilidade na janela aberta
         self.doc_specs = {}
         self.curr_res_map = {} 
+        self._indice_pesquisa = None
         
         num_docs_init = initial_params.get("num_doctors", 3)
         di = 0
@@ -194,6 +253,11 @@ class App(tk.Tk):
         
         self.lbl_pac = tk.Label(top_c_bar, text="Minuto: 000 | Fila: 00", font=("Consolas", 10, "bold"), bg="#ecf0f1", fg=COLOR_HEADER_TEXT)
         self.lbl_pac.pack(side="right", padx=10)
+        self.cmb_vel = ttk.Combobox(top_c_bar, values=["1×", "2×", "5×", "10×", "50×", "100×", "500×", "1000×"],
+                                    width=6, state="readonly")
+        self.cmb_vel.set("1×")
+        self.cmb_vel.pack(side="right")
+        tk.Label(top_c_bar, text="Velocidade:", font=("Arial", 8, "bold"), bg="#ecf0f1", fg="#7f8c8d").pack(side="right", padx=(0, 3))
 
         self.canvas = tk.Canvas(canvas_frame, bg="white", highlightthickness=0)
         self.canvas.pack(expand=True, fill="both", padx=15, pady=15)
@@ -224,7 +288,7 @@ class App(tk.Tk):
         self.ent_m.bind("<FocusOut>", self._update_specs)
         
         tk.Label(p_frame, text="Distribuição:", bg=COLOR_SIDEBAR_BG, fg=COLOR_SIDEBAR_FG).grid(row=2, column=0, sticky="w", pady=4)
-        self.cmb_d = ttk.Combobox(p_frame, values=["exponential","normal","uniform"], width=8)
+        self.cmb_d = ttk.Combobox(p_frame, values=["exponential","normal","uniform","lognormal","gamma"], width=8)
         self.cmb_d.grid(row=2, column=1, pady=4, padx=5)
         
         self.ent_t = create_input(p_frame, "Tempo Médio:", 3)
@@ -242,6 +306,9 @@ class App(tk.Tk):
 
         mk_btn("▶ INICIAR SIMULAÇÃO", self.start_sim, COLOR_BTN_ACTION).pack(fill="x", pady=5)
         mk_btn("⏹ PARAR", self.stop_anim, COLOR_BTN_DANGER).pack(fill="x", pady=5)
+        mk_btn("✖ CANCELAR EXECUÇÃO", self.cancelar_execucao, COLOR_BTN_DANGER).pack(fill="x", pady=5)
+        self.barra = ttk.Progressbar(btn_frame, mode="determinate", maximum=1.0)
+        self.barra.pack(fill="x", pady=5)
         
         tk.Frame(btn_frame, height=1, bg="white").pack(fill="x", pady=15)
         mk_btn("📊 ANALISAR GRÁFICOS", self.open_graphs, COLOR_ACCENT).pack(fill="x", pady=5)
@@ -315,7 +382,7 @@ class App(tk.Tk):
     def load_json(self):
         f = filedialog.askopenfilename(filetypes=[("JSON", "*.json")])
         if f:
-            p = carregar_pacientes_json(f)
+            p = carregar_pacientes(f)
             if p:
                 self.pacientes = p
                 self.dataset_file = f
@@ -454,11 +521,8 @@ class App(tk.Tk):
             else:
                 doenca_show = "Sob Observação"
 
-            emergencias = ["Angina", "Enfarte", "Fratura", "Perna", "Arritmia", "Peito"]
-            urgentes = ["Febre", "Dor", "Infeccao", "Asma", "Otite"]
-            
-            if any(e in doenca_show for e in emergencias): prio_show = "Urgente"
-            elif any(u in doenca_show for u in urgentes): prio_show = "Moderada"
+            # Mesma classificação usada pela simulação (motor de triagem partilhado)
+            prio_show = TRIAGEM.prioridade(doenca_show).capitalize()
             
             pcor = "#27ae60"
             if prio_show == "Urgente": pcor = COLOR_BTN_DANGER
@@ -507,35 +571,19 @@ class App(tk.Tk):
                 tree.delete(item)
             self.curr_res_map.clear()
 
-            qn = en_nome.get().lower().strip()
-            qc = en_cc.get().lower().strip()
-            qs = cb_sx.get().lower()
-            qi = en_idade.get().strip()
-
-            count = 0
-            for p in self.pacientes:
-                match = True
-                if qn:
-                    name_parts = str(p.nome).lower().split()
-                    if not any(part.startswith(qn) for part in name_parts):
-                        match = False
-                
-                if match and qc and qc not in str(p.cc_bi).lower(): match = False
-                if match and qi:
-                    if str(p.idade) != qi: match = False
-                if match and qs:
-                    p_sex = str(p.sexo).lower()
-                    if qs == "outro":
-                        if p_sex in ["masculino", "feminino"]: match = False
-                    else:
-                        if p_sex != qs: match = False
-                
-                if match:
-                    sexo_fmt = str(p.sexo).capitalize() if p.sexo else "N/A"
-                    row_id = tree.insert("", "end", values=(p.cc_bi, p.nome, p.idade, sexo_fmt, p.profissao))
-                    self.curr_res_map[row_id] = p
-                    count += 1
-            
+            # Índices construídos na primeira pesquisa de cada dataset carregado; cada filtro
+            # é uma consulta a um índice e os filtros combinam-se por interseção
+            if self._indice_pesquisa is None or self._indice_pesquisa.pacientes is not self.pacientes:
+                self._indice_pesquisa = IndicePacientes(self.pacientes)
+            achados, count = self._indice_pesquisa.buscar(en_nome.get(), en_cc.get(), en_idade.get(), cb_sx.get(),
+                                                          limite=MAX_RESULTADOS_PESQUISA)
+            for p in achados:
+                sexo_fmt = str(p.sexo).capitalize() if p.sexo else "N/A"
+                row_id = tree.insert("", "end", values=(p.cc_bi, p.nome, p.idade, sexo_fmt, p.profissao))
+                self.curr_res_map[row_id] = p
+
+            mostrados = f" (mostrados {len(achados)})" if count > len(achados) else ""
+            win.title(f"Pesquisa de Utentes - {count} encontrados{mostrados}")
             if count == 0:
                 messagebox.showinfo("Pesquisa", "Nenhum utente encontrado.")
 
@@ -561,20 +609,46 @@ class App(tk.Tk):
                 pacientes=self.pacientes,
                 doctor_specialties=self.doc_specs
             )
-            threading.Thread(target=self._run_bg, daemon=True).start()
+            self.stop_anim()
+            # Uma corrida anterior ainda a decorrer já não vai ser mostrada: pára-a
+            if self._cancelar is not None: self._cancelar.set()
+            self._cancelar = threading.Event()
+            self._progresso = 0.0
+            self.barra["value"] = 0.0
             self.minuto_atual = 0
-            self.canvas.delete("all")
-            self.after(200, self.anim)
+            self._t_anim = None
+            self._montar_cena(self.sim.num_doctors)
+            self._ao_vivo = True
+            # O motor publica instantâneos numa fila thread-safe e o ciclo do Tk vai-a
+            # esvaziando com after(); a thread da simulação nunca toca nos widgets
+            fila = queue.Queue(maxsize=256)
+            threading.Thread(target=self._run_bg, args=(self.sim, fila, self._cancelar), daemon=True).start()
+            self.after(50, lambda: self._drenar_sim(self.sim, fila))
         except ValueError:
             messagebox.showerror("Erro", "Valores numéricos inválidos.")
     
     
-    def _run_bg(self):
-        self.sim.run()
-        st = calcular_estatisticas(self.sim)
+    def _run_bg(self, sim, fila, cancelar):
+        def progresso(fracao, tempo):
+            # Só guarda o valor; a barra é atualizada pelo ciclo do Tk em _drenar_sim
+            if sim is self.sim: self._progresso = fracao
+        try:
+            # Cerca de 2000 instantâneos por corrida, no máximo um por minuto simulado
+            sim.run(instantaneos=fila, intervalo_instantaneos=max(1.0, sim.simulation_time / 2000.0),
+                    progresso=progresso, cancelar=cancelar)
+            st = sim.estatisticas  # já calculadas no fim de run()
+            sim.indice_consultas()  # índice da animação montado aqui, fora do ciclo do Tk
+            fila.put({"relatorio": self._relatorio(st)})
+        except Exception as e:
+            traceback.print_exc()
+            fila.put({"erro": e})
+
+    def _relatorio(self, st):
         
         # --- ALTERAÇÃO AQUI: Adicionar as estatísticas em falta ---
         t = "RELATÓRIO DE SIMULAÇÃO\n" + "="*30 + "\n"
+        if st.get("interrompida"):
+            t += f"INTERROMPIDA ao minuto {st['tempo_interrupcao']:.0f} (resultados parciais)\n" + "-"*30 + "\n"
         t += f"Utentes Atendidos:     {st['doentes_atendidos']}\n"
         t += f"Ocupação Média Médicos: {st['ocupacao_media_medicos']:.1f}%\n"
         t += "-"*30 + "\n"
@@ -594,86 +668,159 @@ class App(tk.Tk):
             # Mostra ID, Especialidade abreviada e % de ocupação
             t += f"M{k+1} [{d['especialidade'][:4].upper()}]: {d['ocupacao_percent']:.1f}% (Atend: {d['num_atendidos']})\n"
             kidx += 1
-            
-        # Atualiza a caixa de texto na Interface
-        self.txt_res.delete("1.0", tk.END)
-        self.txt_res.insert("1.0", t)
+        return t
+
+    def _drenar_sim(self, sim, fila):
+        # Só o último instantâneo de cada lote é desenhado; uma simulação já substituída
+        # por outra continua a ser esvaziada (para a thread acabar) mas não é mostrada
+        atual = sim is self.sim
+        if atual: self.barra["value"] = self._progresso
+        ultimo = None
+        while True:
+            try: item = fila.get_nowait()
+            except queue.Empty: break
+            if "erro" in item:
+                if atual: messagebox.showerror("Erro", f"Falha na simulação: {item['erro']}")
+                return
+            if "relatorio" in item:
+                if not atual: return
+                self.barra["value"] = self._progresso
+                # Atualiza a caixa de texto na Interface
+                self.txt_res.delete("1.0", tk.END)
+                self.txt_res.insert("1.0", item["relatorio"])
+                if self._ao_vivo:
+                    # Terminada a corrida, repete a animação desde o início
+                    self.minuto_atual = 0
+                    self._t_anim = None
+                    self.anim_after = self.after(50, self.anim)
+                return
+            ultimo = item
+        if atual and self._ao_vivo and ultimo is not None:
+            self._mostrar_instantaneo(ultimo)
+        self.after(50, lambda: self._drenar_sim(sim, fila))
+
+    def _mostrar_instantaneo(self, inst):
+        if self._cena is None or len(self._cena["gabinetes"]) != len(inst["medicos"]):
+            self._montar_cena(len(inst["medicos"]))
+        self._mostrar_fila(inst["fila_total"])
+        for gab, m in zip(self._cena["gabinetes"], inst["medicos"]):
+            if m is None: self._mostrar_gabinete(gab, None)
+            else: self._mostrar_gabinete(gab, ("vivo", m["pidx"]), m["paciente"], m["motivo"])
+        self.lbl_pac.config(text=f"A simular... Minuto: {int(inst['tempo'])} | Fila: {inst['fila_total']} | "
+                                 f"Atendidos: {inst['doentes_atendidos']} | Espera média: {inst['tempo_medio_espera']:.1f}")
+
+    def _montar_cena(self, num_medicos):
+        # Os itens do canvas são criados uma vez por simulação; anim() só muda texto, cores e
+        # coordenadas dos que mudaram de estado (itemconfig/coords), sem apagar e recriar tudo
+        c = self.canvas
+        c.delete("all")
+        h_total = 300
+        c.create_rectangle(30, 50, 60, 50+h_total, fill="#ecf0f1", outline="#bdc3c7")
+        c.create_text(45, 40, text="FILA", font=("Arial", 8, "bold"))
+        self._cena = {
+            "fila": None,
+            "fila_barra": c.create_rectangle(30, 50+h_total, 60, 50+h_total, fill="#e74c3c", outline=""),
+            "fila_txt": c.create_text(45, 50+h_total+15, text="0", font=("Arial", 10, "bold"), fill="#e74c3c"),
+            "gabinetes": [],
+        }
+        start_x = 100
+        start_y = 50
+        for d_idx in range(num_medicos):
+            col = d_idx % 2
+            row = d_idx // 2
+            x = start_x + col * 260
+            y = start_y + row * 90
+            spec = self.doc_specs.get(str(d_idx), "Geral")
+            sala = c.create_rectangle(x, y, x+240, y+80, fill="white", outline="#bdc3c7", width=2)
+            c.create_line(x+240, y+20, x+240, y+60, fill="white", width=4)
+            c.create_text(x+10, y+15, text=f"GABINETE {d_idx+1}", font=("Arial", 8, "bold"), anchor="w", fill="#2c3e50")
+            c.create_text(x+230, y+15, text=spec.upper(), font=("Arial", 7), anchor="e", fill="#7f8c8d")
+            # Ajuste de posição para caber as 2 linhas
+            pac = c.create_text(x+10, y+45, text="--", font=("Segoe UI", 9, "bold"), anchor="w", fill="#2c3e50")
+            estado = c.create_text(x+10, y+68, text="LIVRE", font=("Arial", 7, "bold"), anchor="w", fill="#95a5a6")
+            # "chave": consulta mostrada (posição em eventos ou paciente ao vivo; None = livre)
+            self._cena["gabinetes"].append({"sala": sala, "paciente": pac, "estado": estado, "chave": None})
+
+    def _mostrar_fila(self, fila):
+        cena = self._cena
+        if fila != cena["fila"]:
+            h_total = 300
+            h_fill = min(h_total, fila * 5)
+            self.canvas.coords(cena["fila_barra"], 30, 50+(h_total-h_fill), 60, 50+h_total)
+            self.canvas.itemconfig(cena["fila_txt"], text=str(fila))
+            cena["fila"] = fila
+
+    def _mostrar_gabinete(self, gab, chave, paciente=None, motivo=None):
+        # Só mexe nos itens do gabinete quando a consulta mostrada muda
+        if chave == gab["chave"]:
+            return
+        gab["chave"] = chave
+        c = self.canvas
+        if chave is not None:
+            # --- CORREÇÃO FINAL: NOME EM CIMA, DOENÇA EM BAIXO, SEM PARÊNTESES ---
+            pac_txt = "--"
+            if motivo is not None:
+                primeiro_nome = paciente.split()[0] if paciente else "--"
+                pac_txt = f"{primeiro_nome}\n{str(motivo).upper()}"
+            c.itemconfig(gab["sala"], fill="#d5f5e3", outline="#27ae60")
+            c.itemconfig(gab["paciente"], text=pac_txt)
+            c.itemconfig(gab["estado"], text="OCUPADO", fill="#27ae60")
+        else:
+            c.itemconfig(gab["sala"], fill="white", outline="#bdc3c7")
+            c.itemconfig(gab["paciente"], text="--")
+            c.itemconfig(gab["estado"], text="LIVRE", fill="#95a5a6")
+
+    def _velocidade(self):
+        try: return max(1.0, float(self.cmb_vel.get().rstrip("×x ")))
+        except ValueError: return 1.0
 
     def anim(self):
         if not self.sim: return
         try: fs = self.sim.fila_sizes
         except: fs = []
         if not fs: return
-        if self.minuto_atual >= len(fs):
+        # fila_sizes tem uma amostra a cada resolucao_timeline minutos
+        passo = self.sim.resolucao_timeline
+        quadro = int(self.minuto_atual / passo)
+        if quadro >= len(fs):
             self.lbl_pac.config(text="FIM DA SIMULAÇÃO")
             self.stop_anim()
             return
-        self.canvas.delete("all")
-        fila = fs[self.minuto_atual]
-        
-        h_total = 300
-        h_fill = min(h_total, fila * 5)
-        self.canvas.create_rectangle(30, 50, 60, 50+h_total, fill="#ecf0f1", outline="#bdc3c7")
-        self.canvas.create_rectangle(30, 50+(h_total-h_fill), 60, 50+h_total, fill="#e74c3c", outline="")
-        self.canvas.create_text(45, 40, text="FILA", font=("Arial", 8, "bold"))
-        self.canvas.create_text(45, 50+h_total+15, text=str(fila), font=("Arial", 10, "bold"), fill="#e74c3c")
-        
-        on_docs = {}
+        if self._cena is None or len(self._cena["gabinetes"]) != self.sim.num_doctors:
+            self._montar_cena(self.sim.num_doctors)
+        fila = fs[quadro]
+        self._mostrar_fila(fila)
+
+        # Consultas a decorrer: uma pesquisa binária por médico no índice (não percorre os eventos)
+        ativas = self.sim.indice_consultas().ativas(self.minuto_atual)
         evs = self.sim.eventos
-        ei = 0
-        while ei < len(evs):
-            ev = evs[ei]
-            ini = ev['minuto_inicio']
-            dur = ev['duracao']
-            if (ini <= self.minuto_atual) and (self.minuto_atual < ini + dur):
-                on_docs[ev['medico']] = ev
-            ei += 1
-            
-        start_x = 100
-        start_y = 50
-        d_idx = 0
-        while d_idx < self.sim.num_doctors:
-            col = d_idx % 2
-            row = d_idx // 2
-            x = start_x + col * 260
-            y = start_y + row * 90
-            info = on_docs.get(d_idx)
-            spec = self.doc_specs.get(str(d_idx), "Geral")
-            if info:
-                bg_room = "#d5f5e3"
-                border = "#27ae60"
-                cor_status = "#27ae60"
-                
-                # --- CORREÇÃO FINAL: NOME EM CIMA, DOENÇA EM BAIXO, SEM PARÊNTESES ---
-                pac_txt = "--"
-                if 'motivo' in info:
-                    primeiro_nome = info['paciente'].split()[0]
-                    doenca_txt = str(info['motivo']).upper()
-                    pac_txt = f"{primeiro_nome}\n{doenca_txt}"
-                
-                txt_status = "OCUPADO"
-            else:
-                bg_room = "white"
-                border = "#bdc3c7"
-                txt_status = "LIVRE"
-                cor_status = "#95a5a6"
-                pac_txt = "--"
-            
-            self.canvas.create_rectangle(x, y, x+240, y+80, fill=bg_room, outline=border, width=2)
-            self.canvas.create_line(x+240, y+20, x+240, y+60, fill="white", width=4) 
-            self.canvas.create_text(x+10, y+15, text=f"GABINETE {d_idx+1}", font=("Arial", 8, "bold"), anchor="w", fill="#2c3e50")
-            self.canvas.create_text(x+230, y+15, text=spec.upper(), font=("Arial", 7), anchor="e", fill="#7f8c8d")
-            
-            # Ajuste de posição para caber as 2 linhas
-            self.canvas.create_text(x+10, y+45, text=pac_txt, font=("Segoe UI", 9, "bold"), anchor="w", fill="#2c3e50")
-            
-            self.canvas.create_text(x+10, y+68, text=txt_status, font=("Arial", 7, "bold"), anchor="w", fill=cor_status)
-            d_idx += 1
-        self.lbl_pac.config(text=f"Minuto: {self.minuto_atual} | Fila: {fila}")
-        self.minuto_atual += 1
+        for d_idx, gab in enumerate(self._cena["gabinetes"]):
+            k = ativas.get(d_idx)
+            if k is None:
+                self._mostrar_gabinete(gab, None)
+            elif k != gab["chave"]:
+                info = evs[k]
+                self._mostrar_gabinete(gab, k, info['paciente'], info.get('motivo'))
+
+        self.lbl_pac.config(text=f"Minuto: {int(self.minuto_atual)} | Fila: {fila}")
+        # O relógio simulado avança com o tempo real decorrido (1× = um minuto a cada 50 ms):
+        # a velocidades altas, ou com quadros atrasados, os minutos intermédios são saltados
+        agora = time.perf_counter()
+        real = agora - self._t_anim if self._t_anim is not None else 0.05
+        self._t_anim = agora
+        self.minuto_atual += max(passo, self._velocidade() * real / 0.05)
         self.anim_after = self.after(50, self.anim)
 
+    def cancelar_execucao(self):
+        # Pede a paragem da simulação e da análise de sensibilidade em curso; ambas acabam
+        # com os resultados que já tiverem (o motor vê o pedido a cada poucos milhares de eventos)
+        for ev in (self._cancelar, self._cancelar_comp):
+            if ev is not None: ev.set()
+
     def stop_anim(self):
+        # Pára a visualização (ao vivo ou a repetição); a simulação em curso continua e o
+        # relatório aparece quando acabar
+        self._ao_vivo = False
         if self.anim_after:
             self.after_cancel(self.anim_after)
             self.anim_after = None
@@ -704,28 +851,28 @@ class App(tk.Tk):
         t4 = tk.Frame(nb, bg=tab_bg); nb.add(t4, text="Produtividade")
         grafico_ocupacao_medicos_bar(t4, self.sim.stats_por_medico)
         
+        t_cauda = tk.Frame(nb, bg=tab_bg); nb.add(t_cauda, text="Tempos de Cauda")
+        grafico_cauda_frame(t_cauda, self.sim.estatisticas.get("cauda"))
+        
         t5 = tk.Frame(nb, bg=tab_bg); nb.add(t5, text="Sensibilidade")
         
         container_plot = tk.Frame(t5, bg=tab_bg)
         container_plot.pack(fill="both", expand=True)
+        self._plot_comp = container_plot
         
         btn_recalc = tk.Button(t5, text="Calcular Impacto (Atualizar Gráfico)", 
-                               command=lambda: self.run_comp(win),
+                               command=self.run_comp,
                                bg=COLOR_BTN_ACTION, fg="white", font=FONT_SUBTITLE, relief="flat")
         btn_recalc.pack(pady=10, side="bottom")
 
         if self.comp_data:
             grafico_fila_vs_taxa_frame(container_plot, *self.comp_data)
         else:
-            tk.Label(container_plot, text="Clique abaixo para gerar a análise.\nIsto simula múltiplos cenários com os parâmetros atuais.", 
+            tk.Label(container_plot, text="Clique abaixo para gerar a análise.\nIsto simula múltiplos cenários (5 replicações cada, em paralelo) com os parâmetros atuais.", 
                      bg=tab_bg, font=FONT_SUBTITLE).pack(expand=True)
 
-    def run_comp(self, win):
-        win.destroy()
-        rates = range(10, 31, 5)
-        avgs = []
-        r_list = list(rates)
-        idx = 0
+    def run_comp(self):
+        rates = list(range(10, 31, 5))
         
         self._update_specs()
         
@@ -736,24 +883,75 @@ class App(tk.Tk):
             sim_docs = 3
             
         sim_time = 800
-        
-        while idx < len(r_list):
-            r = r_list[idx]
-            s = SimulacaoClinica(
-                lambda_rate=r, num_doctors=sim_docs, service_distribution="exponential",
-                mean_service_time=float(self.ent_t.get()), simulation_time=sim_time, 
-                pacientes=self.pacientes, arrival_pattern="homogeneo", 
-                doctor_specialties=self.doc_specs
-            )
-            s.run()
-            v = 0
-            if s.fila_sizes: v = np.mean(s.fila_sizes)
-            avgs.append(v)
-            idx += 1
-            
-        self.comp_data = (r_list, avgs)
-        self.open_graphs()
+        base = dict(num_doctors=sim_docs, service_distribution="exponential",
+                    mean_service_time=float(self.ent_t.get()), simulation_time=sim_time,
+                    arrival_pattern="homogeneo", doctor_specialties=dict(self.doc_specs))
+        
+        # Todos os pontos são simulados; com consultas exponenciais e só clínica geral a
+        # clínica é uma M/M/c e a fila de Erlang C dos pontos estáveis aparece logo, como
+        # referência (o horizonte finito e o arranque vazio afastam a simulação dela)
+        analitico = None
+        if aplica_analitico(base):
+            estaveis = [(r, mmc(r, sim_docs, base["mean_service_time"])) for r in rates]
+            estaveis = [(r, m["fila_media"]) for r, m in estaveis if m["estavel"]]
+            analitico = ([r for r, _ in estaveis], [q for _, q in estaveis])
+        pontos = {}
+        self.comp_data = ([], [], [], analitico) if analitico else None
+        if analitico: self._desenhar_comp()
+
+        # O varrimento corre numa thread (que alimenta o pool de processos) e os pontos
+        # chegam por uma fila que a interface vai esvaziando com after()
+        fila = queue.Queue()
+        if self._cancelar_comp is not None: self._cancelar_comp.set()
+        cancelar = self._cancelar_comp = threading.Event()
+        def trabalho():
+            try:
+                for ponto in varrimento(self.pacientes, {"lambda_rate": rates}, base, replicacoes=5, seed=0,
+                                        cancelar=cancelar):
+                    fila.put(ponto)
+            except Exception as e:
+                traceback.print_exc()
+                fila.put(e)
+            fila.put(None)
+        threading.Thread(target=trabalho, daemon=True).start()
+        self.lbl_pac.config(text=f"Sensibilidade: 0/{len(rates)}")
+        self.after(100, lambda: self._recolher_comp(fila, rates, pontos, analitico))
+
+    def _desenhar_comp(self):
+        # Redesenha a curva se a janela dos gráficos ainda estiver aberta (senão fica em
+        # comp_data para a próxima vez que for aberta)
+        frame = self._plot_comp
+        if frame is not None and frame.winfo_exists():
+            grafico_fila_vs_taxa_frame(frame, *self.comp_data)
+
+    def _recolher_comp(self, fila, rates, pontos, analitico=None):
+        terminou = False; novos = False
+        while True:
+            try: item = fila.get_nowait()
+            except queue.Empty: break
+            if item is None:
+                terminou = True; break
+            if isinstance(item, Exception):
+                messagebox.showerror("Erro", f"Falha na análise de sensibilidade: {item}")
+                continue
+            # Um ponto interrompido tem menos replicações e corridas cortadas: não entra na curva
+            if not item.get("interrompido"):
+                pontos[item["parametros"]["lambda_rate"]] = item; novos = True
+        self.lbl_pac.config(text=f"Sensibilidade: {len(pontos)}/{len(rates)}")
+        self.barra["value"] = len(pontos) / len(rates)
+        if novos:
+            # Cada ponto simulado entra na curva assim que chega
+            r_list = [r for r in rates if r in pontos]
+            self.comp_data = (r_list, [pontos[r]["fila_media"] for r in r_list],
+                              [pontos[r]["fila_media_ic95"] for r in r_list], analitico)
+            self._desenhar_comp()
+        if not terminou:
+            self.after(100, lambda: self._recolher_comp(fila, rates, pontos, analitico))
+            return
+        if not pontos:
+            messagebox.showinfo("Info", "Análise de sensibilidade cancelada antes de haver pontos.")
 
     def _on_close(self):
         self.stop_anim()
+        self.cancelar_execucao()
         self.destroy()
\ No newline at end of file
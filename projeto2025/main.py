@@ -1,7 +1,8 @@
 import argparse
+import csv
 import json
 import os
-from interface import App
+import sys
 
 CONFIG_FILE = "config.json"
 
@@ -22,11 +23,11 @@ def load_initial_config():
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 json_config = json.load(f)
                 config.update({k: (float(v) if isinstance(config.get(k), float) else v) for k, v in json_config.items()})
-            print(f"Configuracoes carregadas de {CONFIG_FILE}.")
+            print(f"Configuracoes carregadas de {CONFIG_FILE}.", file=sys.stderr)
         except Exception as e:
-            print(f"Erro ao carregar {CONFIG_FILE}: {e}. Usando valores padrao.")
+            print(f"Erro ao carregar {CONFIG_FILE}: {e}. Usando valores padrao.", file=sys.stderr)
     else:
-        print(f"Ficheiro {CONFIG_FILE} nao encontrado. Usando valores padrao.")
+        print(f"Ficheiro {CONFIG_FILE} nao encontrado. Usando valores padrao.", file=sys.stderr)
         
     return config
 
@@ -39,6 +40,25 @@ def parse_cli_arguments(config):
     parser.add_argument('--simulation_time', type=int, help='Duracao total da simulacao (minutos).')
     parser.add_argument('--arrival_pattern', type=str, help='Padrao de chegada (homogeneous ou nonhomogeneous).')
     parser.add_argument('--dataset_file', type=str, help='Caminho para o ficheiro JSON de pacientes.')
+    # --- MODO BATCH (SEM INTERFACE) ---
+    parser.add_argument('--headless', action='store_true', help='Corre sem interface grafica e escreve as estatisticas.')
+    parser.add_argument('--replications', type=int, default=1, help='Numero de replicacoes (seeds diferentes).')
+    parser.add_argument('--jobs', type=int, default=None, help='Processos em paralelo para as replicacoes (0 = no processo atual).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed base das replicacoes.')
+    parser.add_argument('--limite', type=int, default=None, help='Numero maximo de pacientes a carregar.')
+    parser.add_argument('--sem_cache', action='store_true', help='Le sempre o JSON, sem usar nem criar a cache colunar.')
+    parser.add_argument('--compacto', action='store_true', help='Guarda o estado dos pacientes em arrays NumPy.')
+    # --- REGIME ESTACIONARIO ---
+    parser.add_argument('--aquecimento', type=str, default=None, help='Minutos a descartar no inicio ou "mser5" (deteccao automatica).')
+    parser.add_argument('--epsilon', type=float, default=None, help='Duplica o horizonte ate a meia-largura do IC (medias por lotes) ficar abaixo deste valor.')
+    parser.add_argument('--relativo', action='store_true', help='Com --epsilon, usa a meia-largura relativa a media.')
+    # --- OTIMIZACAO DA EQUIPA ---
+    parser.add_argument('--otimizar', type=float, default=None, help='Procura a equipa mais barata com o objetivo abaixo deste valor (minutos).')
+    parser.add_argument('--objetivo', type=str, default='p90', help='Metrica da espera a cumprir (media, p50, p90, p95, p99, max).')
+    parser.add_argument('--objetivo_prioridade', type=str, default='urgente', help='Prioridade do objetivo ("todas" para a espera global, ex.: --objetivo espera_p90).')
+    parser.add_argument('--custo_medico', type=float, default=1.0, help='Custo de cada medico.')
+    parser.add_argument('--max_medicos', type=int, default=None, help='Maior equipa a considerar.')
+    parser.add_argument('--out', type=str, default=None, help='Ficheiro de saida (.json ou .csv); por omissao JSON no stdout.')
 
     args, unknown = parser.parse_known_args() 
 
@@ -51,10 +71,123 @@ def parse_cli_arguments(config):
     if args.arrival_pattern is not None: final_config['arrival_pattern'] = args.arrival_pattern
     if args.dataset_file is not None: final_config['dataset_file'] = args.dataset_file 
     
-    return final_config
+    return final_config, args
+
+# Parâmetros da configuração que passam diretamente para SimulacaoClinica
+SIM_PARAMS = ["lambda_rate", "num_doctors", "service_distribution", "mean_service_time",
+              "simulation_time", "arrival_pattern", "arrival_profile", "doctor_specialties",
+              "medias_especialidade", "fatores_prioridade", "dados_servico", "cv_servico"]
+
+def _json_default(obj):
+    # Escalares NumPy (np.int64, np.float64, ...) e arrays
+    if hasattr(obj, "tolist"): return obj.tolist()
+    raise TypeError(f"Tipo nao serializavel: {type(obj)}")
+
+def escrever_resultados(resultado, destino):
+    if destino and destino.lower().endswith(".csv"):
+        # Uma linha por replicacao com as metricas escalares (sem o detalhe por medico)
+        linhas = resultado["replicacoes"]
+        campos = ["replicacao"] + ([k for k, v in linhas[0].items() if not isinstance(v, dict)] if linhas else [])
+        with open(destino, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=campos, extrasaction="ignore")
+            w.writeheader()
+            for i, linha in enumerate(linhas):
+                w.writerow({"replicacao": i, **linha})
+    else:
+        texto = json.dumps(resultado, indent=2, ensure_ascii=False, default=_json_default)
+        if destino:
+            with open(destino, "w", encoding="utf-8") as f:
+                f.write(texto)
+        else:
+            print(texto)
+
+def _referencia_analitica(params, estatisticas):
+    # Valores M/M/c equivalentes e a verificação da simulação contra eles, quando se aplicam
+    from analitico import mmc_de, verificar_simulacao
+    ref = mmc_de(params)
+    if ref is None: return None
+    # Infinito (clínica instável) não é JSON válido
+    ref = {k: (None if isinstance(v, float) and v == float("inf") else v) for k, v in ref.items()}
+    ref["verificacao"] = verificar_simulacao(estatisticas, params)
+    return ref
+
+def run_headless(cfg, args):
+    # Só módulos sem Tk/matplotlib: arranca depressa e corre em servidores sem display
+    from cache_pacientes import carregar_pacientes
+    from sensibilidade import correr_replicacoes, intervalo_confianca, METRICAS
+    import numpy as np
+
+    # A amostra e a ordem dos pacientes também vêm da seed: a mesma --seed dá os mesmos resultados
+    pacientes = carregar_pacientes(cfg["dataset_file"], limite=args.limite, usar_cache=not args.sem_cache,
+                                   rng=np.random.default_rng(np.random.SeedSequence([args.seed, 1])))
+    if not pacientes:
+        print(f"Sem pacientes em {cfg['dataset_file']}.", file=sys.stderr)
+        return 1
+    params = {k: cfg[k] for k in SIM_PARAMS if k in cfg}
+    if args.compacto: params["compacto"] = True
+
+    if args.otimizar is not None:
+        from otimizador import otimizar_equipa
+        prio = None if args.objetivo_prioridade == "todas" else args.objetivo_prioridade
+        res = otimizar_equipa(pacientes, params, args.otimizar, metrica=args.objetivo, prioridade=prio,
+                              custo_medico=args.custo_medico, max_medicos=args.max_medicos,
+                              replicacoes=max(1, args.replications), seed=args.seed, max_workers=args.jobs)
+        for a in res["avaliados"]:
+            a.update({k: None for k in ("utilizacao", "valor_ic95") if a[k] != a[k] or a[k] == float("inf")})
+        escrever_resultados({"parametros": params, "seed": args.seed, "num_pacientes": len(pacientes),
+                             "otimizacao": res, "replicacoes": []}, args.out)
+        return 0
+
+    if args.aquecimento is not None or args.epsilon is not None:
+        # Uma corrida longa analisada por médias de lotes em vez de replicações independentes
+        from estacionario import estimar_estacionario
+        aquec = args.aquecimento or "mser5"
+        if aquec != "mser5": aquec = float(aquec)
+        res = estimar_estacionario(pacientes, params, epsilon=args.epsilon, relativo=args.relativo,
+                                   aquecimento=aquec, seed=args.seed)
+        res = {k: (None if isinstance(v, float) and v != v else v) for k, v in res.items()}
+        resultado = {"parametros": params, "seed": args.seed, "num_pacientes": len(pacientes),
+                     "estacionario": res, "replicacoes": []}
+        if res.get("interrompido"): resultado["interrompido"] = True
+        analitico = _referencia_analitica(params, res)
+        if analitico is not None: resultado["analitico"] = analitico
+        escrever_resultados(resultado, args.out)
+        return 0
+
+    # Ctrl-C pára as replicações em curso e o resumo fica só com o que chegou a correr
+    pedidas = max(1, args.replications)
+    reps = correr_replicacoes(pacientes, params, replicacoes=pedidas, seed=args.seed, max_workers=args.jobs)
+    if not reps:
+        print("Interrompido antes de alguma replicação correr.", file=sys.stderr)
+        return 130
+    resumo = {}
+    for m in METRICAS:
+        media, meia = intervalo_confianca([r[m] for r in reps])
+        # Com uma só replicação não há IC (NaN não é JSON válido)
+        resumo[m] = media; resumo[m + "_ic95"] = meia if meia == meia else None
+    # Cauda da espera por prioridade: média dos p95/p99 de cada replicação
+    for prio in ("urgente", "moderada", "normal"):
+        for pct in ("p95", "p99"):
+            vals = [r["cauda"]["por_prioridade"][prio]["espera"][pct] for r in reps
+                    if prio in r.get("cauda", {}).get("por_prioridade", {})]
+            if vals:
+                media, meia = intervalo_confianca(vals)
+                chave = f"espera_{pct}_{prio}"
+                resumo[chave] = media; resumo[chave + "_ic95"] = meia if meia == meia else None
+    resultado = {"parametros": params, "seed": args.seed, "num_pacientes": len(pacientes),
+                 "resumo": resumo, "replicacoes": reps}
+    if len(reps) < pedidas or any(r.get("interrompida") for r in reps):
+        resultado["interrompido"] = True
+    analitico = _referencia_analitica(params, resumo)
+    if analitico is not None: resultado["analitico"] = analitico
+    escrever_resultados(resultado, args.out)
+    return 0
 
 if __name__ == "__main__":
     initial_config = load_initial_config()
-    final_config = parse_cli_arguments(initial_config)
+    final_config, cli_args = parse_cli_arguments(initial_config)
+    if cli_args.headless:
+        sys.exit(run_headless(final_config, cli_args))
+    from interface import App
     app = App(initial_params=final_config)
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
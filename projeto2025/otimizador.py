@@ -0,0 +1,200 @@
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sensibilidade import (_concluidos, _criar_pool, _evento_pool, capturar_ctrl_c, correr_simulacao,
+                           intervalo_confianca, seed_replicacao)
+from triagem import FALLBACK_ESP
+
+# Procura da equipa mais barata (número de médicos e especialidades) que cumpre um objetivo
+# de espera. Só as condições de estabilidade (capacidade acima da procura de cada grupo de
+# filas) eliminam equipas: as fórmulas de Erlang C não são um limite para esta clínica,
+# em que o clínico geral atende primeiro a sua fila e só depois as das especialidades. As
+# equipas que sobram são confirmadas por simulações com seed, por ordem de custo, num
+# único pool de processos que recebe os pacientes uma só vez.
+
+# Estatísticas da espera disponíveis por prioridade em estatisticas["cauda"]
+METRICAS_OBJETIVO = ("media", "p50", "p90", "p95", "p99", "max")
+
+
+def valor_objetivo(estatisticas: Dict[str, Any], metrica: str = "p90",
+                   prioridade: Optional[str] = "urgente") -> float:
+    """Valor da métrica-objetivo numa corrida: espera da prioridade ou, sem prioridade, a chave global."""
+    if prioridade is None:
+        return float(estatisticas[metrica])
+    grupo = estatisticas.get("cauda", {}).get("por_prioridade", {}).get(prioridade)
+    # Sem doentes dessa prioridade ninguém esperou
+    return float(grupo["espera"][metrica]) if grupo else 0.0
+
+
+def estimar_procura(pacientes, params: Dict[str, Any], seed: int = 0, cancelar=None) -> Dict[Tuple[str, str], float]:
+    """Chegadas por hora de cada par (prioridade, especialidade), a partir de uma corrida piloto.
+
+    A triagem tem um fluxo aleatório próprio, por isso a mistura de doentes não depende da
+    equipa: a corrida piloto usa médicos de clínica geral em número folgado só para todos
+    os doentes chegarem a ser atendidos e contados.
+    """
+    lam = float(params.get("lambda_rate", 10))
+    folga = max(int(params.get("num_doctors", 3)),
+                int(math.ceil(lam * float(params.get("mean_service_time", 15)) / 60.0 * 2)) + 2)
+    piloto = {k: v for k, v in params.items() if k not in ("pacientes", "seed", "doctor_specialties")}
+    piloto["num_doctors"] = folga
+    st = correr_simulacao(piloto, seed, pacientes, cancelar)
+    if st is None: return {}
+    grupos = st["cauda"]["por_prioridade_especialidade"]
+    total = sum(g["n"] for g in grupos.values())
+    procura = {}
+    for chave, g in grupos.items():
+        prio, esp = chave.split("/", 1)
+        procura[(prio, esp)] = lam * g["n"] / total if total else 0.0
+    return procura
+
+
+def _custo(equipa: Dict[str, int], custo_medico: Union[float, Dict[str, float]]) -> float:
+    if isinstance(custo_medico, dict):
+        return sum(n * float(custo_medico.get(esp, custo_medico.get(FALLBACK_ESP, 1.0))) for esp, n in equipa.items())
+    return float(custo_medico) * sum(equipa.values())
+
+
+def _utilizacao(equipa: Dict[str, int], procura_esp: Dict[str, float], mu: float) -> float:
+    # A maior utilização que a equipa teria de aguentar: os clínicos gerais com os doentes
+    # sem especialista (e os da clínica geral), e cada especialidade com os seus
+    # especialistas mais os clínicos gerais. Abaixo de 1 em todas é condição necessária
+    gerais = equipa.get(FALLBACK_ESP, 0)
+    descobertos = sum(l for esp, l in procura_esp.items() if esp == FALLBACK_ESP or not equipa.get(esp))
+    cargas = [descobertos / (gerais * mu) if gerais else (math.inf if descobertos > 0 else 0.0)]
+    for esp, l in procura_esp.items():
+        capacidade = (equipa.get(esp, 0) + gerais) * mu
+        cargas.append(l / capacidade if capacidade else (math.inf if l > 0 else 0.0))
+    return max(cargas)
+
+
+def _mapa(equipa: Dict[str, int]) -> Dict[str, str]:
+    # doctor_specialties: especialistas primeiro (por nome) e clínicos gerais no fim
+    nomes = [esp for esp in sorted(equipa) if esp != FALLBACK_ESP for _ in range(equipa[esp])]
+    nomes += [FALLBACK_ESP] * equipa.get(FALLBACK_ESP, 0)
+    return {str(i): esp for i, esp in enumerate(nomes)}
+
+
+def _misturas(total: int, procura_esp: Dict[str, float]) -> List[Dict[str, int]]:
+    """Equipas de `total` médicos, de só clínicos gerais até só especialistas.
+
+    Para cada número de especialistas, estes são repartidos pelas especialidades com
+    procura pelo método de D'Hondt (o próximo vai para a especialidade com mais procura
+    por especialista), por isso há total + 1 equipas por tamanho em vez de todas as
+    repartições possíveis.
+    """
+    especialidades = sorted(esp for esp, l in procura_esp.items() if esp != FALLBACK_ESP and l > 0)
+    equipas = []
+    for gerais in range(total, -1, -1):
+        equipa = {esp: 0 for esp in especialidades}
+        for _ in range(total - gerais if especialidades else 0):
+            esp = max(especialidades, key=lambda e: (procura_esp[e] / (equipa[e] + 1), e))
+            equipa[esp] += 1
+        equipa = {esp: n for esp, n in equipa.items() if n}
+        if sum(equipa.values()) < total - gerais: continue   # sem especialidades para preencher
+        if gerais: equipa[FALLBACK_ESP] = gerais
+        equipas.append(equipa)
+    return equipas
+
+
+def otimizar_equipa(pacientes, params: Dict[str, Any], limite: float, metrica: str = "p90",
+                    prioridade: Optional[str] = "urgente", custo_medico: Union[float, Dict[str, float]] = 1.0,
+                    max_medicos: Optional[int] = None, replicacoes: int = 5, seed: int = 0,
+                    exigir_ic: bool = False, max_simulacoes: int = 40, podar: bool = True,
+                    max_workers: Optional[int] = None, cancelar=None) -> Dict[str, Any]:
+    """Equipa mais barata cujo objetivo (ex.: p90 da espera dos urgentes) fica abaixo de `limite`.
+
+    metrica/prioridade: uma de METRICAS_OBJETIVO da espera dessa prioridade, ou com
+    prioridade=None uma chave global de calcular_estatisticas (ex.: "espera_p90").
+    custo_medico: custo de cada médico, único ou por especialidade.
+    max_medicos: maior equipa a considerar (por omissão, o dobro do mínimo estável mais 3).
+    exigir_ic: uma equipa só conta como viável se o limite superior do IC a 95% cumprir.
+    max_simulacoes: número máximo de equipas a confirmar por simulação.
+    podar: eliminar as equipas que não podem ser estáveis (utilização >= 1 em algum grupo
+    de filas); podar=False simula-as também.
+
+    Para cada número de médicos, a partir do mínimo com capacidade para a procura, entram
+    as misturas de _misturas; no mesmo custo são simuladas primeiro as de menor utilização.
+    Devolve o doctor_specialties escolhido (None se nenhuma equipa confirmar), o custo, o
+    valor simulado do objetivo e o registo das equipas avaliadas. Todas as equipas correm
+    com as mesmas seeds (números aleatórios comuns). Com Ctrl-C (ou `cancelar` marcado)
+    pára e devolve o que já confirmou, com "interrompido": True; as equipas com alguma
+    replicação cortada não contam como avaliadas.
+    """
+    params = {k: v for k, v in params.items() if k not in ("pacientes", "seed")}
+    s = float(params.get("mean_service_time", 15)); mu = 60.0 / s   # consultas por hora e médico
+    cancelar = cancelar if cancelar is not None else threading.Event()
+    with capturar_ctrl_c(cancelar):
+        procura = estimar_procura(pacientes, params, seed, cancelar)
+        procura_esp: Dict[str, float] = {}
+        for (_, esp), l in procura.items():
+            procura_esp[esp] = procura_esp.get(esp, 0.0) + l
+        lam = sum(procura.values())
+
+        # Limite inferior: com menos médicos a capacidade total não chega para a procura
+        minimo = max(1, int(math.floor(lam / mu)) + 1) if podar else 1
+        teto = max_medicos if max_medicos is not None else 2 * minimo + 3
+
+        candidatos = []; podados = 0
+        for total in range(minimo, teto + 1):
+            for equipa in _misturas(total, procura_esp):
+                utilizacao = _utilizacao(equipa, procura_esp, mu)
+                if podar and utilizacao >= 1.0:
+                    podados += 1; continue
+                candidatos.append((_custo(equipa, custo_medico), utilizacao, total, equipa))
+        candidatos.sort(key=lambda c: (c[0], c[1], c[2]))
+
+        res: Dict[str, Any] = {"doctor_specialties": None, "num_doctors": None, "custo": None,
+                               "limite": limite, "metrica": metrica, "prioridade": prioridade,
+                               "minimo_medicos": minimo, "candidatos": len(candidatos), "podados": podados,
+                               "procura": {f"{p}/{e}": l for (p, e), l in sorted(procura.items())},
+                               "avaliados": []}
+        if not candidatos or cancelar.is_set():
+            if cancelar.is_set(): res["interrompido"] = True
+            return res
+
+        seeds = [seed_replicacao(seed, r) for r in range(replicacoes)]
+        lote = max_workers or os.cpu_count() or 1
+        # Com max_workers=0 corre tudo no processo atual, sem pool
+        cancelar_pool = _evento_pool() if max_workers != 0 else None
+        pool = _criar_pool(pacientes, max_workers, cancelar_pool) if max_workers != 0 else None
+        try:
+            pos = 0
+            while pos < len(candidatos) and pos < max_simulacoes and not cancelar.is_set():
+                ronda = candidatos[pos:min(pos + lote, max_simulacoes)]
+                pos += len(ronda)
+                tarefas = [({**params, "num_doctors": total, "doctor_specialties": _mapa(equipa)}, sd)
+                           for _, _, total, equipa in ronda for sd in seeds]
+                if pool is None:
+                    estatisticas = [correr_simulacao(pr, sd, pacientes, cancelar) for pr, sd in tarefas]
+                else:
+                    futuros = {pool.submit(correr_simulacao, pr, sd): k for k, (pr, sd) in enumerate(tarefas)}
+                    estatisticas = [None] * len(tarefas)
+                    for f in _concluidos(futuros, cancelar, cancelar_pool):
+                        estatisticas[futuros[f]] = f.result()
+                viaveis = []
+                for i, (custo, utilizacao, total, equipa) in enumerate(ronda):
+                    grupo = estatisticas[i * replicacoes:(i + 1) * replicacoes]
+                    # Replicações canceladas (None) ou cortadas a meio não servem para decidir
+                    if any(st is None or st.get("interrompida") for st in grupo):
+                        continue
+                    valores = [valor_objetivo(st, metrica, prioridade) for st in grupo]
+                    media, meia = intervalo_confianca(valores)
+                    teste = media + (meia if exigir_ic and meia == meia else 0.0)
+                    avaliado = {"doctor_specialties": _mapa(equipa), "num_doctors": total, "custo": custo,
+                                "utilizacao": utilizacao, "valor": media, "valor_ic95": meia,
+                                "viavel": teste <= limite}
+                    res["avaliados"].append(avaliado)
+                    if avaliado["viavel"]: viaveis.append(avaliado)
+                if viaveis:
+                    # A lista está ordenada por custo: nada do que falta avaliar é mais barato
+                    melhor = min(viaveis, key=lambda a: (a["custo"], a["valor"]))
+                    res.update(doctor_specialties=melhor["doctor_specialties"], num_doctors=melhor["num_doctors"],
+                               custo=melhor["custo"], valor=melhor["valor"], valor_ic95=melhor["valor_ic95"])
+                    break
+        finally:
+            if pool is not None: pool.shutdown()
+        if cancelar.is_set(): res["interrompido"] = True
+        return res
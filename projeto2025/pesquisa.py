@@ -0,0 +1,143 @@
+import bisect
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Índices da pesquisa de utentes, construídos uma vez por dataset carregado: cada filtro
+# (nome, CC/BI, idade, sexo) dá um conjunto de linhas sem percorrer os pacientes, e os
+# filtros combinados são a interseção desses conjuntos.
+
+SEXOS = ("masculino", "feminino", "outro")
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos ("Conceição" -> "conceicao")."""
+    decomposto = unicodedata.normalize("NFKD", str(texto).casefold())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def _bits_ativos(bitmap: np.ndarray, linhas: np.ndarray) -> np.ndarray:
+    # Bit de cada linha num bitmap de np.packbits (ordem "big": linha 0 no bit mais alto)
+    return ((bitmap[linhas >> 3] >> (7 - (linhas & 7)).astype(np.uint8)) & 1) == 1
+
+
+def _colunas(pacientes) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Nomes, CC/BI (minúsculas), idades e sexos (minúsculas) de todos os pacientes; a cache
+    # colunar dá-os sem construir um Paciente por linha (idades inteiras, -1 sem idade)
+    if hasattr(pacientes, "coluna"):
+        idades = pacientes.coluna("idade").astype(np.int64)
+        return (pacientes.coluna("nome"), np.char.lower(pacientes.coluna("cc_bi")),
+                idades, np.char.lower(pacientes.coluna("sexo")))
+    return (np.array([str(p.nome) for p in pacientes], dtype=str),
+            np.array([str(p.cc_bi).lower() for p in pacientes], dtype=str),
+            np.array([str(p.idade) for p in pacientes], dtype=str),
+            np.array([str(p.sexo).lower() for p in pacientes], dtype=str))
+
+
+def _texto_idade(valor) -> str:
+    # Idade como str(p.idade): a da cache vem inteira, com -1 em vez de None
+    if isinstance(valor, str): return str(valor)
+    return str(int(valor)) if valor >= 0 else "None"
+
+
+class IndicePacientes:
+    """Índices para pesquisar utentes por nome, CC/BI, idade e sexo.
+
+    - nome: lista ordenada dos tokens dos nomes (normalizados) com as linhas de cada um;
+      um prefixo é um intervalo contíguo da lista, encontrado por bisseção;
+    - CC/BI: dicionário com o valor exato e, para pesquisas por parte do número, todos os
+      valores num só texto onde a procura corre em C;
+    - idade e sexo: um bitmap (np.packbits) por valor, combinados com AND.
+    """
+
+    def __init__(self, pacientes: Sequence[Any]):
+        self.pacientes = pacientes
+        self.n = n = len(pacientes)
+        nomes, ccs, idades, sexos = _colunas(pacientes)
+
+        # Muitos utentes têm o mesmo nome: os tokens só são tirados de cada nome distinto, e
+        # as linhas de um token juntam os grupos de linhas dos nomes que o contêm
+        distintos, grupo = np.unique(np.asarray(nomes, dtype=str), return_inverse=True)
+        grupo = grupo.reshape(-1)
+        ordem = np.argsort(grupo, kind="stable")
+        linhas_nome = np.split(ordem, np.cumsum(np.bincount(grupo, minlength=len(distintos)))[:-1])
+        por_token: Dict[str, List[int]] = {}
+        for d, nome in enumerate(distintos.tolist()):
+            for chave in {normalizar(tok) for tok in nome.split()}:
+                por_token.setdefault(chave, []).append(d)
+        self._tokens = sorted(por_token)
+        self._linhas_token = [np.sort(np.concatenate([linhas_nome[d] for d in por_token[t]])) for t in self._tokens]
+
+        lista_cc = ccs.tolist()
+        self._cc: Dict[str, Any] = dict(zip(lista_cc, range(n)))
+        if len(self._cc) < n:
+            # CC/BI repetidos (ex.: "n/a" sem documento): cada valor guarda a lista das linhas
+            self._cc = {}
+            for i, cc in enumerate(lista_cc):
+                self._cc.setdefault(cc, []).append(i)
+        # "\n" separa os valores, por isso nenhuma ocorrência atravessa dois utentes
+        self._cc_texto = "\n".join(lista_cc)
+        self._cc_inicio = np.concatenate(([0], np.cumsum(np.char.str_len(ccs) + 1)[:-1])) if n else np.zeros(0, dtype=np.int64)
+
+        # Idade como texto, a mesma comparação do filtro original (str(idade) == texto escrito)
+        valores, codigos = np.unique(idades, return_inverse=True)
+        self._idade = {_texto_idade(v): np.packbits(codigos == k) for k, v in enumerate(valores)}
+        sexo = np.select([sexos == SEXOS[0], sexos == SEXOS[1]], [0, 1], 2)
+        self._sexo = {nome: np.packbits(sexo == k) for k, nome in enumerate(SEXOS)}
+
+    def por_nome(self, texto: str) -> np.ndarray:
+        # Linhas com um token a começar por cada palavra do texto (todas as palavras têm de casar)
+        res: Optional[np.ndarray] = None
+        for palavra in normalizar(texto).split():
+            ini = bisect.bisect_left(self._tokens, palavra)
+            fim = ini
+            while fim < len(self._tokens) and self._tokens[fim].startswith(palavra): fim += 1
+            linhas = (np.unique(np.concatenate(self._linhas_token[ini:fim])) if fim - ini > 1 else
+                      self._linhas_token[ini] if fim > ini else np.zeros(0, dtype=np.int64))
+            res = linhas if res is None else np.intersect1d(res, linhas, assume_unique=True)
+            if res.size == 0: break
+        return res if res is not None else np.arange(self.n, dtype=np.int64)
+
+    def por_cc(self, texto: str) -> np.ndarray:
+        # Valor completo: uma consulta ao dicionário; parte do número: procura no texto único
+        texto = texto.lower()
+        if texto in self._cc:
+            return np.atleast_1d(np.asarray(self._cc[texto], dtype=np.int64))
+        if not texto or "\n" in texto:
+            return np.zeros(0, dtype=np.int64)
+        posicoes = np.fromiter((m.start() for m in re.finditer(re.escape(texto), self._cc_texto)), dtype=np.int64)
+        return np.unique(np.searchsorted(self._cc_inicio, posicoes, side="right") - 1)
+
+    def buscar(self, nome: str = "", cc: str = "", idade: str = "", sexo: str = "",
+               limite: Optional[int] = None) -> Tuple[List[Any], int]:
+        """Pacientes que passam todos os filtros não vazios, pela ordem do dataset.
+
+        nome: prefixo de uma palavra do nome (sem distinguir acentos nem maiúsculas);
+        cc: o CC/BI ou parte dele; idade: texto da idade; sexo: um de SEXOS ("outro" é
+        tudo o que não é masculino nem feminino). Devolve até `limite` pacientes e o total.
+        """
+        nome, cc, idade, sexo = nome.strip(), cc.strip(), idade.strip(), sexo.strip().lower()
+        linhas: Optional[np.ndarray] = None
+        if nome: linhas = self.por_nome(nome)
+        if cc:
+            achados = self.por_cc(cc)
+            linhas = achados if linhas is None else np.intersect1d(linhas, achados, assume_unique=True)
+
+        bitmap: Optional[np.ndarray] = None
+        for mapa, valor in ((self._idade, idade), (self._sexo, sexo)):
+            if not valor: continue
+            b = mapa.get(valor)
+            if b is None: return [], 0
+            bitmap = b if bitmap is None else bitmap & b
+        if bitmap is not None:
+            if linhas is None:
+                linhas = np.flatnonzero(np.unpackbits(bitmap, count=self.n))
+            else:
+                linhas = linhas[_bits_ativos(bitmap, linhas)]
+        if linhas is None:
+            linhas = np.arange(self.n, dtype=np.int64)
+        total = int(linhas.size)
+        if limite is not None: linhas = linhas[:limite]
+        return [self.pacientes[int(i)] for i in linhas], total
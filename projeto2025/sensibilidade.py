@@ -0,0 +1,292 @@
+import contextlib
+import itertools
+import math
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from simulacao import SimulacaoClinica
+
+# Métricas agregadas em cada ponto da grelha
+METRICAS = ["fila_media", "tempo_medio_espera", "ocupacao_media_medicos", "doentes_atendidos"]
+
+# Quantis t de Student (bilaterais a 95%); entre duas entradas usa-se a de menos graus de
+# liberdade (quantil maior), para o IC nunca sair mais estreito do que o exato
+_T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+        18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+        26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+
+
+def quantil_t95(graus: int) -> float:
+    if graus <= 0: return float("nan")
+    return _T95[max(g for g in _T95 if g <= graus)]
+
+
+def intervalo_confianca(valores) -> Tuple[float, float]:
+    """(média, meia-largura do IC a 95%) de uma amostra de replicações independentes."""
+    arr = np.asarray(valores, dtype=float)
+    if arr.size == 0: return float("nan"), float("nan")
+    media = float(np.mean(arr))
+    if arr.size < 2: return media, float("nan")
+    meia = quantil_t95(arr.size - 1) * float(np.std(arr, ddof=1)) / math.sqrt(arr.size)
+    return media, meia
+
+
+def grelha_parametros(grelha: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    # Produto cartesiano, ex.: {"lambda_rate": [10, 20], "num_doctors": [3, 4]} -> 4 pontos
+    chaves = list(grelha.keys())
+    return [dict(zip(chaves, valores)) for valores in itertools.product(*(grelha[k] for k in chaves))]
+
+
+def seed_replicacao(seed_base: int, replicacao: int) -> int:
+    # A replicação r usa a mesma seed em todos os pontos da grelha (números aleatórios comuns)
+    return int(np.random.SeedSequence([seed_base, replicacao]).generate_state(1)[0])
+
+
+# --- TRABALHADORES ---
+# Os pacientes chegam a cada processo uma única vez, pelo initializer do pool,
+# em vez de irem serializados com cada tarefa.
+_PACIENTES_WORKER: List[Any] = []
+# Pedido de paragem visto pelas simulações de um worker: o evento partilhado do pool ou,
+# sem ele, um local. Em ambos os casos o Ctrl-C (SIGINT chega a todo o grupo de processos)
+# só o marca, e a simulação em curso acaba com estatísticas parciais.
+_CANCELAR_WORKER: Any = threading.Event()
+
+
+def _inicializar_worker(pacientes, cancelar=None):
+    global _PACIENTES_WORKER, _CANCELAR_WORKER
+    _PACIENTES_WORKER = pacientes
+    if cancelar is not None: _CANCELAR_WORKER = cancelar
+    signal.signal(signal.SIGINT, lambda *a: _CANCELAR_WORKER.set())
+
+
+@contextlib.contextmanager
+def capturar_ctrl_c(cancelar):
+    """Durante o bloco o Ctrl-C marca `cancelar` em vez de lançar KeyboardInterrupt.
+
+    Só tem efeito na thread principal (é aí que o Python entrega os sinais); noutras threads
+    o bloco corre sem mudar nada e a paragem vem apenas de quem marcar o evento.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield cancelar
+        return
+    anterior = signal.signal(signal.SIGINT, lambda *a: cancelar.set())
+    try:
+        yield cancelar
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+
+
+def correr_simulacao(params: Dict[str, Any], seed: int, pacientes=None, cancelar=None) -> Optional[Dict[str, Any]]:
+    # Devolve o dicionário completo de calcular_estatisticas de uma replicação (com
+    # "interrompida" se parou a meio), ou None se a paragem foi pedida antes de começar
+    if cancelar is None: cancelar = _CANCELAR_WORKER
+    if cancelar.is_set(): return None
+    sim = SimulacaoClinica(pacientes=pacientes if pacientes is not None else _PACIENTES_WORKER, seed=seed, **params)
+    sim.run(cancelar=cancelar)
+    return sim.estatisticas
+
+
+def correr_replicacao(params: Dict[str, Any], seed: int, pacientes=None, cancelar=None) -> Optional[Dict[str, float]]:
+    st = correr_simulacao(params, seed, pacientes, cancelar)
+    if st is None: return None
+    res = {m: float(st[m]) for m in METRICAS}
+    if st.get("interrompida"): res["interrompida"] = True
+    return res
+
+
+@contextlib.contextmanager
+def _sigint_ignorado():
+    # SIGINT ignorado durante o bloco; a disposição SIG_IGN passa para os processos lançados
+    # (fora da thread principal não se pode mudar o tratador e o bloco corre sem mudar nada)
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    anterior = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+
+
+def _criar_pool(pacientes, max_workers: Optional[int], cancelar=None) -> ProcessPoolExecutor:
+    # "spawn" evita copiar por fork o estado de threads (ex.: a interface Tk) para os workers.
+    # `cancelar` tem de vir do mesmo contexto (_evento_pool) para chegar aos workers.
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                               initializer=_inicializar_worker, initargs=(pacientes, cancelar))
+    # Os workers arrancam já aqui, com o SIGINT ignorado (a disposição passa pelo exec): um
+    # Ctrl-C a meio do arranque não os mata nem parte o pool, e o initializer põe depois o
+    # seu tratador. Um Ctrl-C durante estes lançamentos (e o envio dos pacientes) perde-se.
+    with _sigint_ignorado():
+        for _ in range(max_workers or os.cpu_count() or 1):
+            pool.submit(int)
+    return pool
+
+
+def _evento_pool():
+    return multiprocessing.get_context("spawn").Event()
+
+
+def _concluidos(futuros, cancelar, cancelar_pool) -> Iterator[Any]:
+    # Como as_completed, mas a ver o pedido de paragem: quando `cancelar` é marcado passa-o
+    # aos workers, cancela as tarefas por começar e continua só pelas que já corriam (que
+    # acabam depressa, com estatísticas parciais)
+    pendentes = set(futuros); parado = False
+    while pendentes:
+        feitos, pendentes = wait(pendentes, timeout=0.2, return_when=FIRST_COMPLETED)
+        for f in feitos:
+            if not f.cancelled(): yield f
+        # Um Ctrl-C que só os workers viram também conta como pedido de paragem
+        if not parado and (cancelar.is_set() or cancelar_pool.is_set()):
+            parado = True
+            cancelar.set(); cancelar_pool.set()
+            for f in pendentes: f.cancel()
+
+
+def correr_replicacoes(pacientes, params: Dict[str, Any], replicacoes: int = 1, seed: int = 0,
+                       max_workers: Optional[int] = None, cancelar=None) -> List[Dict[str, Any]]:
+    """Estatísticas completas de `replicacoes` corridas de um único cenário, pela ordem das seeds.
+
+    Com Ctrl-C (ou `cancelar` marcado) devolve só as replicações que chegaram a correr,
+    as que pararam a meio com "interrompida": True.
+    """
+    params = {k: v for k, v in params.items() if k not in ("pacientes", "seed")}
+    seeds = [seed_replicacao(seed, r) for r in range(replicacoes)]
+    cancelar = cancelar if cancelar is not None else threading.Event()
+    with capturar_ctrl_c(cancelar):
+        if max_workers == 0 or replicacoes == 1:
+            res = [correr_simulacao(params, s, pacientes, cancelar) for s in seeds]
+        else:
+            cancelar_pool = _evento_pool()
+            with _criar_pool(pacientes, max_workers, cancelar_pool) as pool:
+                futuros = {pool.submit(correr_simulacao, params, s): r for r, s in enumerate(seeds)}
+                feitos = {futuros[f]: f.result() for f in _concluidos(futuros, cancelar, cancelar_pool)}
+            res = [feitos.get(r) for r in range(replicacoes)]
+    return [st for st in res if st is not None]
+
+
+def resumir_ponto(params: Dict[str, Any], replicacoes: List[Dict[str, float]]) -> Dict[str, Any]:
+    # Replicações que nem chegaram a correr (None, depois de um Ctrl-C) não contam
+    feitas = [r for r in replicacoes if r is not None]
+    res = {"parametros": dict(params), "replicacoes": len(feitas)}
+    if len(feitas) < len(replicacoes) or any(r.get("interrompida") for r in feitas): res["interrompido"] = True
+    for m in METRICAS:
+        media, meia = intervalo_confianca([r[m] for r in feitas])
+        res[m] = media
+        res[m + "_ic95"] = meia
+    return res
+
+
+def varrimento(pacientes, grelha: Dict[str, List[Any]], base: Optional[Dict[str, Any]] = None,
+               replicacoes: int = 5, seed: int = 0, max_workers: Optional[int] = None,
+               cancelar=None) -> Iterator[Dict[str, Any]]:
+    """Corre `replicacoes` simulações com seed por cada ponto da grelha e vai devolvendo os pontos.
+
+    Cada ponto é devolvido (com média e meia-largura do IC a 95% de cada métrica) assim que
+    as suas replicações terminam, pela ordem em que acabam. Com max_workers=0 corre tudo no
+    processo atual, sem pool.
+
+    Com Ctrl-C (na thread principal) ou `cancelar` marcado o varrimento pára: os pontos com
+    alguma replicação feita saem com as que houver e "interrompido": True.
+    """
+    base = dict(base or {})
+    base.pop("pacientes", None); base.pop("seed", None)
+    pontos = [{**base, **p} for p in grelha_parametros(grelha)]
+    seeds = [seed_replicacao(seed, r) for r in range(replicacoes)]
+    feitos: Dict[int, Dict[int, Dict[str, float]]] = {i: {} for i in range(len(pontos))}
+    cancelar = cancelar if cancelar is not None else threading.Event()
+
+    with capturar_ctrl_c(cancelar):
+        if max_workers == 0:
+            for i, params in enumerate(pontos):
+                reps = [r for r in (correr_replicacao(params, s, pacientes, cancelar) for s in seeds) if r is not None]
+                if not reps: return
+                ponto = resumir_ponto(params, reps)
+                if len(reps) < replicacoes: ponto["interrompido"] = True
+                yield ponto
+                if cancelar.is_set(): return
+            return
+
+        cancelar_pool = _evento_pool()
+        with _criar_pool(pacientes, max_workers, cancelar_pool) as pool:
+            futuros = {pool.submit(correr_replicacao, params, s): (i, r)
+                       for i, params in enumerate(pontos) for r, s in enumerate(seeds)}
+            for fut in _concluidos(futuros, cancelar, cancelar_pool):
+                i, r = futuros[fut]
+                rep = fut.result()
+                if rep is None: continue
+                feitos[i][r] = rep
+                if len(feitos[i]) == replicacoes:
+                    # Agrega pela ordem das replicações para o resultado não depender do escalonamento
+                    yield resumir_ponto(pontos[i], [feitos[i][k] for k in range(replicacoes)])
+        if cancelar.is_set():
+            for i in range(len(pontos)):
+                if 0 < len(feitos[i]) < replicacoes:
+                    ponto = resumir_ponto(pontos[i], [feitos[i][k] for k in sorted(feitos[i])])
+                    ponto["interrompido"] = True
+                    yield ponto
+
+
+def comparar_cenarios(pacientes, cenario_a: Dict[str, Any], cenario_b: Dict[str, Any], replicacoes: int = 10,
+                      seed: int = 0, antiteticas: bool = False, max_workers: Optional[int] = None,
+                      cancelar=None) -> Dict[str, Any]:
+    """Compara dois cenários (ex.: 3 vs 4 médicos) com números aleatórios comuns.
+
+    Na replicação r os dois cenários correm com a mesma seed, por isso partilham chegadas,
+    triagens e durações das consultas e a diferença B - A de cada replicação tem muito
+    menos ruído; o IC a 95% é o do t emparelhado sobre essas diferenças. Com `antiteticas`
+    cada replicação é o par (corrida, corrida antitética) e conta a média do par.
+    Para comparação devolve-se também a meia-largura que se teria com corridas independentes.
+
+    Com Ctrl-C (ou `cancelar` marcado) só entram as replicações em que todas as corridas
+    acabaram inteiras, e o resultado sai com "interrompido": True.
+    """
+    a = {k: v for k, v in cenario_a.items() if k not in ("pacientes", "seed")}
+    b = {k: v for k, v in cenario_b.items() if k not in ("pacientes", "seed")}
+    seeds = [seed_replicacao(seed, r) for r in range(replicacoes)]
+    modos = ["inversao", "antitetica"] if antiteticas else [None]
+    tarefas = [({**params, "amostragem": modo} if modo else params, s)
+               for s in seeds for params in (a, b) for modo in modos]
+    cancelar = cancelar if cancelar is not None else threading.Event()
+
+    with capturar_ctrl_c(cancelar):
+        if max_workers == 0 or len(tarefas) == 1:
+            resultados = [correr_replicacao(p, s, pacientes, cancelar) for p, s in tarefas]
+        else:
+            cancelar_pool = _evento_pool()
+            with _criar_pool(pacientes, max_workers, cancelar_pool) as pool:
+                futuros = {pool.submit(correr_replicacao, p, s): k for k, (p, s) in enumerate(tarefas)}
+                feitos = {futuros[f]: f.result() for f in _concluidos(futuros, cancelar, cancelar_pool)}
+            resultados = [feitos.get(k) for k in range(len(tarefas))]
+
+    # resultados vêm por (replicação, cenário, modo); uma replicação com alguma corrida em
+    # falta ou cortada a meio deixaria de ser um par comparável e fica de fora
+    por_tarefa = 2 * len(modos)
+    completas = [resultados[r * por_tarefa:(r + 1) * por_tarefa] for r in range(replicacoes)]
+    completas = [grupo for grupo in completas
+                 if all(x is not None and not x.get("interrompida") for x in grupo)]
+    n = len(completas)
+    por_rep = np.array([[x[m] for m in METRICAS] for grupo in completas for x in grupo], dtype=float)
+    por_rep = por_rep.reshape(n, 2, len(modos), len(METRICAS)).mean(axis=2)
+    res = {"cenario_a": a, "cenario_b": b, "replicacoes": n, "antiteticas": antiteticas, "metricas": {}}
+    if n < replicacoes: res["interrompido"] = True
+    for j, m in enumerate(METRICAS):
+        va = por_rep[:, 0, j]; vb = por_rep[:, 1, j]
+        media_a, meia_a = intervalo_confianca(va)
+        media_b, meia_b = intervalo_confianca(vb)
+        dif, meia_dif = intervalo_confianca(vb - va)
+        if n > 1:
+            meia_indep = quantil_t95(n - 1) * math.sqrt((np.var(va, ddof=1) + np.var(vb, ddof=1)) / n)
+        else:
+            meia_indep = float("nan")
+        res["metricas"][m] = {"a": media_a, "a_ic95": meia_a, "b": media_b, "b_ic95": meia_b,
+                              "diferenca": dif, "diferenca_ic95": meia_dif,
+                              "diferenca_ic95_independente": meia_indep}
+    return res
@@ -0,0 +1,85 @@
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# Distribuições do tempo de consulta aceites (com os sinónimos em português)
+DISTRIBUICOES = {
+    "exponential": "exponential", "exponencial": "exponential",
+    "normal": "normal",
+    "uniform": "uniform", "uniforme": "uniform",
+    "lognormal": "lognormal",
+    "gamma": "gamma", "gama": "gamma",
+    "empirical": "empirical", "empirica": "empirical",
+}
+
+# Coeficiente de variação por omissão da lognormal e da gama
+CV_OMISSAO = 0.5
+
+
+class AmostradorServico:
+    """Tempos de consulta tirados de blocos pré-sorteados em vez de uma chamada NumPy por consulta.
+
+    Os blocos guardam variáveis de média 1 da distribuição escolhida; cada consulta só
+    multiplica a próxima pela média aplicável (por especialidade e por prioridade), e o
+    bloco é reposto com uma única chamada vetorial quando se esgota. As durações saem pela
+    ordem em que são pedidas, por isso o paciente k recebe a mesma variável em qualquer
+    cenário com a mesma seed.
+
+    medias_especialidade: média (minutos) por especialidade; as restantes usam `media`.
+    fatores_prioridade: multiplicador da média por prioridade (ex.: {"urgente": 1.5}).
+    dados: durações observadas, para a distribuição "empirical" (reamostradas).
+    """
+
+    def __init__(self, distribuicao: str, media: float, rng, bloco: int = 4096,
+                 medias_especialidade: Optional[Dict[str, float]] = None,
+                 fatores_prioridade: Optional[Dict[str, float]] = None,
+                 dados: Optional[Sequence[float]] = None, cv: Optional[float] = None):
+        # Distribuições desconhecidas caem na exponencial, como em gera_tempo_consulta
+        self.distribuicao = DISTRIBUICOES.get(distribuicao, "exponential")
+        self.media = float(media)
+        self.medias_especialidade = dict(medias_especialidade or {})
+        self.fatores_prioridade = dict(fatores_prioridade or {})
+        self.cv = CV_OMISSAO if cv is None else float(cv)
+        self._rng = rng
+        self._bloco = int(bloco)
+        if self.distribuicao == "empirical":
+            arr = np.asarray(dados if dados is not None else [], dtype=float)
+            arr = arr[arr > 0]
+            if arr.size == 0:
+                raise ValueError("A distribuição empírica precisa de durações observadas (dados)")
+            self._dados_unit = arr / arr.mean()
+        self._pool = np.empty(0)
+        self._pos = 0
+
+    def _sortear_unitarios(self, n: int) -> np.ndarray:
+        rng = self._rng; d = self.distribuicao
+        if d == "normal":
+            return rng.normal(1.0, 0.2, size=n)
+        if d == "uniform":
+            return rng.uniform(0.5, 1.5, size=n)
+        if d == "lognormal":
+            s2 = np.log1p(self.cv ** 2)
+            return np.exp(rng.normal(-s2 / 2, np.sqrt(s2), size=n))
+        if d == "gamma":
+            forma = 1.0 / self.cv ** 2
+            return rng.gamma(forma, 1.0 / forma, size=n)
+        if d == "empirical":
+            return self._dados_unit[rng.integers(0, self._dados_unit.size, size=n)]
+        return rng.exponential(1.0, size=n)
+
+    def media_de(self, especialidade: Optional[str] = None, prioridade: Optional[str] = None) -> float:
+        m = self.medias_especialidade.get(especialidade, self.media)
+        return m * self.fatores_prioridade.get(prioridade, 1.0)
+
+    def proximo(self, especialidade: Optional[str] = None, prioridade: Optional[str] = None) -> float:
+        if self._pos >= self._pool.size:
+            self._pool = self._sortear_unitarios(self._bloco); self._pos = 0
+        u = self._pool[self._pos]; self._pos += 1
+        val = float(u) * self.media_de(especialidade, prioridade)
+        # Como em gera_tempo_consulta, a normal nunca dá consultas abaixo de 0.1 min
+        return max(0.1, val) if self.distribuicao == "normal" else val
+
+    def amostrar(self, n: int, especialidade: Optional[str] = None, prioridade: Optional[str] = None) -> np.ndarray:
+        # n durações de uma vez (não consome o bloco corrente)
+        val = self._sortear_unitarios(n) * self.media_de(especialidade, prioridade)
+        return np.maximum(0.1, val) if self.distribuicao == "normal" else val
@@ -1,28 +1,53 @@
 import os
 import json
+import queue
 import random
 import numpy as np
 import heapq
 import itertools
 import math
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from filas import FilaPrioridade, PoolMedicosLivres, IndiceFilasNaoVazias
+from estado import EstadoDicionarios, EstadoCompacto
+from estatisticas import AcumuladorEstatisticas, metricas_cauda
+from aleatorio import criar_fluxos
+from servico import AmostradorServico
+from triagem import Triagem, TRIAGEM, DOENCA_TO_ESP, FALLBACK_ESP
 
 # --- CONSTANTES GLOBAIS ---
-FALLBACK_ESP = "clinica_geral"
 CHEGADA = "CHEGADA"
 SAIDA = "SAIDA"
 
-DOENCA_TO_ESP = {
-    "asma": "pneumologia", "bronquite": "pneumologia", "covid": "pneumologia", "falta de ar": "pneumologia",
-    "diabetes": "endocrinologia", "obesidade": "endocrinologia", 
-    "angina": "cardiologia", "arritmia": "cardiologia", "hipertensão": "cardiologia", "dor no peito": "cardiologia", "enfarte": "cardiologia",
-    "fractura": "ortopedia", "fratura": "ortopedia", "queda": "ortopedia", "luxacao": "ortopedia", "entorse": "ortopedia", "perna partida": "ortopedia",
-    "otite": "otorrino", "rinite": "otorrino", "sinusite": "otorrino", "dor de ouvidos": "otorrino",
-    "geriatria_cronica": "geriatria", "demencia": "geriatria",
-    "febre": "clinica_geral", "virose": "clinica_geral", "gripe": "clinica_geral", "dor de cabeça": "clinica_geral", "checkup": "clinica_geral"
-}
+# Campos do perfil que a simulação nunca lê (só a ficha da pesquisa)
+CAMPOS_DETALHE = ("morada", "descrição", "atributos", "religiao", "desportos")
+
+def distrito_de(morada) -> Optional[str]:
+    # Distrito mostrado no gráfico de distritos ("Desconhecido" sem morada)
+    try:
+        return morada.get('distrito') if morada else "Desconhecido"
+    except AttributeError:
+        return "Desconhecido"
+
+def texto_triagem(descricao) -> str:
+    # Descrição pronta para a triagem; "" quando não serve e a doença tem de ser sorteada
+    texto = descricao.lower() if isinstance(descricao, str) else ""
+    return "" if TRIAGEM.precisa_fallback(texto) else texto
+
+def _campo_detalhe(nome: str, omissao=None):
+    def ler(self):
+        return self.detalhes().get(nome, omissao)
+    def escrever(self, valor):
+        if self._detalhes is None:
+            self._detalhes = dict(self.detalhes())
+        self._detalhes[nome] = valor
+    return property(ler, escrever)
 
 class Paciente:
+    # Só os campos que a simulação usa vivem no objeto; o resto do perfil fica em _detalhes
+    # ou é lido da fonte (cache) pela linha quando alguém o pede
+    __slots__ = ("id", "cc_bi", "nome", "idade", "profissao", "prioridade", "sexo", "distrito", "doenca",
+                 "_detalhes", "_fonte", "_linha")
+
     def __init__(self, id: str, cc_bi: str, nome: str, idade: Optional[int] = None,
                  profissao: Optional[str] = None, prioridade: str = "normal", **kwargs):
         self.id = id           
@@ -32,64 +57,154 @@ class Paciente:
         self.profissao = profissao
         self.prioridade = "normal" 
         self.sexo = kwargs.get('sexo')
-        self.morada = kwargs.get('morada', {}) 
-        self.descrição = kwargs.get('descrição')
-        self.atributos = kwargs.get('atributos')
-        self.religiao = kwargs.get('religiao')
-        self.desportos = kwargs.get('desportos')
+        # fonte/linha: objeto com detalhes(linha) de onde ler o perfil a pedido (ex.: a cache)
+        self._fonte = kwargs.get('fonte')
+        self._linha = kwargs.get('linha')
+        if self._fonte is None:
+            self._detalhes = {k: kwargs[k] for k in CAMPOS_DETALHE if k in kwargs}
+            self._detalhes.setdefault('morada', {})
+        else:
+            self._detalhes = None
+        self.distrito = kwargs['distrito'] if 'distrito' in kwargs else distrito_de(kwargs.get('morada', {}))
+        self.doenca = kwargs['doenca'] if 'doenca' in kwargs else texto_triagem(kwargs.get('descrição'))
+
+    def detalhes(self) -> Dict[str, Any]:
+        if self._detalhes is not None:
+            return self._detalhes
+        return self._fonte.detalhes(self._linha)
+
+    morada = _campo_detalhe('morada', {})
+    descrição = _campo_detalhe('descrição')
+    atributos = _campo_detalhe('atributos')
+    religiao = _campo_detalhe('religiao')
+    desportos = _campo_detalhe('desportos')
         
     def __repr__(self):
         return f"{self.nome} ({self.prioridade})"
 
-def carregar_pacientes_json(ficheiro: str, limite: Optional[int] = None) -> List[Paciente]:
+def iterar_array_json(ficheiro: str, tam_bloco: int = 1 << 20) -> Iterator[Any]:
+    # Lê um array JSON de topo elemento a elemento, em blocos de texto, sem carregar o
+    # ficheiro inteiro: a memória fica limitada a um bloco mais o maior elemento
+    decoder = json.JSONDecoder()
+    with open(ficheiro, "r", encoding="utf-8") as f:
+        buf = ""; pos = 0; eof = False
+
+        def encher():
+            nonlocal buf, pos, eof
+            mais = f.read(tam_bloco)
+            if not mais: eof = True
+            buf = buf[pos:] + mais; pos = 0
+
+        def proximo_char() -> str:
+            # Salta espaços (lendo mais texto se preciso); "" no fim do ficheiro
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n": pos += 1
+                if pos < len(buf): return buf[pos]
+                if eof: return ""
+                encher()
+
+        if proximo_char() != "[":
+            raise ValueError("o ficheiro não contém um array JSON")
+        pos += 1
+        if proximo_char() == "]":
+            return
+        while True:
+            proximo_char()
+            while True:
+                try:
+                    obj, fim = decoder.raw_decode(buf, pos)
+                    # Um número no fim do bloco pode estar cortado ("2." de "2.5"): só se aceita
+                    # o elemento quando o separador seguinte já foi lido
+                    if eof or (fim < len(buf) and buf[fim] in " \t\r\n,]"): break
+                except json.JSONDecodeError:
+                    # Elemento cortado a meio do bloco: junta o bloco seguinte e tenta de novo
+                    if eof: raise
+                encher()
+            pos = fim
+            yield obj
+            c = proximo_char()
+            if c == "]": return
+            if c != ",":
+                raise ValueError(f"JSON inválido: esperava ',' ou ']' e encontrou {c!r}")
+            pos += 1
+
+def _e_medico(p: Dict[str, Any]) -> bool:
+    profissao = str(p.get("profissao", "")).lower()
+    return "médico" in profissao or "medicina" in profissao
+
+def _registo_para_paciente(p: Dict[str, Any], i: int) -> Optional[Paciente]:
+    # Converte um registo do dataset; devolve None para os médicos (não são pacientes)
+    if _e_medico(p):
+        return None
+    
+    internal_id = p.get("id", f"p{i}")
+    real_doc_id = p.get("CC") or p.get("BI") or p.get("cc") or "N/A"
+    
+    # Carrega a descrição crua (mesmo com latim) para a ficha, 
+    # mas a simulação vai ignorá-la se for lixo.
+    raw_desc = p.get('descrição')
+    
+    return Paciente(
+        id=str(internal_id),
+        cc_bi=str(real_doc_id),
+        nome=p.get("nome", f"Pessoa {i+1}"),
+        idade=p.get("idade"),
+        profissao=p.get("profissao"),
+        prioridade="normal", 
+        sexo=p.get('sexo'),
+        morada=p.get('morada'),
+        descrição=raw_desc,
+        atributos=p.get('atributos', {}),
+        religiao=p.get('religiao'),
+        desportos=p.get('desportos')
+    )
+
+def iterar_pacientes_json(ficheiro: str) -> Iterator[Paciente]:
+    # Produz os pacientes à medida que o ficheiro é lido (os médicos são filtrados logo aqui)
+    i = 0
+    for p in iterar_array_json(ficheiro):
+        pac = _registo_para_paciente(p, i)
+        if pac is not None:
+            yield pac
+        i += 1
+
+def _rng_carregamento(rng: Optional[np.random.Generator]) -> np.random.Generator:
+    # Sem gerador dado a ordem dos pacientes vem do módulo random global (como antes)
+    return rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+def carregar_pacientes_json(ficheiro: str, limite: Optional[int] = None,
+                            rng: Optional[np.random.Generator] = None) -> List[Paciente]:
+    # rng decide a amostra (com limite) e a ordem dos pacientes: com um gerador com seed o
+    # mesmo ficheiro dá sempre a mesma lista
     if not os.path.exists(ficheiro):
         return []
+    rng = _rng_carregamento(rng)
 
-    data = None
+    pacientes = []
     try:
-        with open(ficheiro, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        if limite is None:
+            pacientes = list(iterar_pacientes_json(ficheiro))
+        else:
+            # Amostragem por reservatório: memória O(limite) e cada paciente do ficheiro tem
+            # a mesma probabilidade de ficar na amostra. Guardam-se os registos crus e só
+            # os escolhidos chegam a ser convertidos em Paciente.
+            reservatorio = []; visto = 0; i = 0
+            for p in iterar_array_json(ficheiro):
+                if not _e_medico(p):
+                    if visto < limite:
+                        reservatorio.append((i, p))
+                    else:
+                        j = int(rng.integers(visto + 1))
+                        if j < limite: reservatorio[j] = (i, p)
+                    visto += 1
+                i += 1
+            pacientes = [_registo_para_paciente(p, idx) for idx, p in reservatorio]
     except Exception as e:
         print(f"Erro ao ler {ficheiro}: {e}")
         return []
-    
-    if data is None: return []
 
-    pacientes = []
-    i = 0
-    while i < len(data):
-        p = data[i]
-        profissao = str(p.get("profissao", "")).lower()
-        is_doctor = "médico" in profissao or "medicina" in profissao
-        
-        internal_id = p.get("id", f"p{i}")
-        real_doc_id = p.get("CC") or p.get("BI") or p.get("cc") or "N/A"
-        
-        # Carrega a descrição crua (mesmo com latim) para a ficha, 
-        # mas a simulação vai ignorá-la se for lixo.
-        raw_desc = p.get('descrição')
-        
-        if not is_doctor:
-            pacientes.append(Paciente(
-                id=str(internal_id),
-                cc_bi=str(real_doc_id),
-                nome=p.get("nome", f"Pessoa {i+1}"),
-                idade=p.get("idade"),
-                profissao=p.get("profissao"),
-                prioridade="normal", 
-                sexo=p.get('sexo'),
-                morada=p.get('morada'),
-                descrição=raw_desc,
-                atributos=p.get('atributos', {}),
-                religiao=p.get('religiao'),
-                desportos=p.get('desportos')
-            ))
-        i += 1
-
-    random.shuffle(pacientes)
-    if limite is not None:
-        pacientes = pacientes[:limite]
-    return pacientes
+    return [pacientes[k] for k in rng.permutation(len(pacientes))]
 
 def gera_intervalo_tempo_chegada(taxa, rng: Optional[np.random.Generator] = None):
     val = float('inf')
@@ -98,6 +213,28 @@ def gera_intervalo_tempo_chegada(taxa, rng: Optional[np.random.Generator] = None
         val = float(rng.exponential(1.0 / taxa_por_minuto)) if rng else float(np.random.exponential(1.0 / taxa_por_minuto))
     return val
 
+def itera_tempos_chegada(taxa, inicio, fim, max_n, rng: Optional[np.random.Generator] = None,
+                         bloco: Optional[int] = None) -> Iterator[np.ndarray]:
+    # Chegadas de Poisson (taxa por hora) em [inicio, fim), no máximo max_n, entregues em
+    # blocos ordenados. Os intervalos são gerados com NumPy e acumulados com cumsum, e cada
+    # bloco só é sorteado quando o anterior é consumido (fim e max_n podem ser infinitos).
+    if taxa <= 0 or fim <= inicio or max_n <= 0:
+        return
+    rng = rng if rng is not None else np.random.default_rng()
+    escala = 60.0 / taxa
+    if bloco is None:
+        bloco = 1024
+    total = 0; t = float(inicio)
+    while total < max_n:
+        ts = t + np.cumsum(rng.exponential(escala, size=int(min(bloco, max_n - total))))
+        dentro = ts[:np.searchsorted(ts, fim, side="left")]
+        total += dentro.size
+        if dentro.size:
+            yield dentro
+        if dentro.size < ts.size:
+            break
+        t = float(ts[-1])
+
 def gera_tempo_consulta(media, distribuicao="exponential", rng: Optional[np.random.Generator] = None):
     val = 0.0
     if distribuicao in ("exponential", "exponencial"):
@@ -111,16 +248,49 @@ def gera_tempo_consulta(media, distribuicao="exponential", rng: Optional[np.rand
         val = float(rng.exponential(scale=media)) if rng else float(np.random.exponential(scale=media))
     return val
 
-def calcular_estatisticas(sim) -> dict:
+def _item_chegada(item, pidx: int) -> Tuple[float, int]:
+    # Item de uma fonte_chegadas: um tempo, ou um par (tempo, índice do paciente) em qualquer
+    # sequência (tuplo, lista, linha de um array); tudo o resto é erro da fonte
+    try:
+        if isinstance(item, (str, bytes)): raise TypeError
+        if np.ndim(item) == 0:
+            return float(item), pidx
+        if len(item) != 2: raise TypeError
+        t, p = float(item[0]), item[1]
+        if int(p) != p: raise TypeError
+        return t, int(p)
+    except (TypeError, ValueError):
+        raise ValueError(f"fonte_chegadas: chegada {pidx} inválida ({item!r}); esperava um tempo "
+                         f"ou um par (tempo, paciente)") from None
+
+def amostrar_degraus(tempos, valores, instantes) -> np.ndarray:
+    # Lê uma função em escada (valor válido a partir de cada tempo) nos instantes pedidos.
+    # Os tempos vêm ordenados do ciclo de eventos, por isso basta uma pesquisa binária.
+    tempos_arr = np.asarray(tempos, dtype=float)
+    valores_arr = np.asarray(valores, dtype=float)
+    inst_arr = np.asarray(instantes, dtype=float)
+    if tempos_arr.size == 0:
+        return np.zeros(inst_arr.size)
+    pos = np.searchsorted(tempos_arr, inst_arr, side="right") - 1
+    res = np.zeros(inst_arr.size)
+    validos = pos >= 0
+    res[validos] = valores_arr[pos[validos]]
+    return res
+
+def calcular_estatisticas(sim, ate: Optional[float] = None, cauda: bool = True) -> dict:
+    # Lê o acumulador atualizado durante o ciclo de eventos (não percorre listas de tempos).
+    # Com `ate` dá o retrato até esse instante, o que permite consultar a meio da corrida;
+    # só a cauda por grupo percorre as colunas por paciente (cauda=False deixa-a vazia).
+    acc = sim._acumulador
+    decorrido = float(sim.simulation_time) if ate is None else min(float(ate), float(sim.simulation_time))
+    div = max(1.0, decorrido)
     ii = 0
     while ii < len(sim._medicos):
         m = sim._medicos[ii]
-        tempos = m.get("tempos_consulta", []) or []
-        num_att = m.get("num_atendidos", 0)
-        total_ocup_individual = sum(tempos)
+        num_att = acc.num_atendidos[ii]
+        total_ocup_individual = acc.tempo_consulta[ii]
         
-        media_cons = float(np.mean(tempos)) if len(tempos) > 0 else 0.0
-        div = max(1.0, float(sim.simulation_time))
+        media_cons = total_ocup_individual / num_att if num_att > 0 else 0.0
         ocup_percent = 100.0 * total_ocup_individual / div
         if ocup_percent > 100.0: ocup_percent = 100.0
         
@@ -131,37 +301,33 @@ def calcular_estatisticas(sim) -> dict:
         }
         ii += 1
 
-    tempos_esp_arr = np.array(sim.tempos_espera) if len(sim.tempos_espera) > 0 else np.array([0.0])
-    tempos_cons_arr = np.array(sim.tempos_consulta) if len(sim.tempos_consulta) > 0 else np.array([0.0])
-    fila_arr = np.array(sim.fila_sizes) if len(sim.fila_sizes) > 0 else np.array([0])
-    
-    t_line = sim.slots_ocupados[:sim.simulation_time]
-    t_line = np.minimum(t_line, sim.num_doctors) 
-    media_medicos_ocupados = np.mean(t_line)
+    # Fila e médicos ocupados em média ponderada pelo tempo (independente de resolucao_timeline)
+    media_medicos_ocupados = min(acc.ocupados.media(decorrido), sim.num_doctors)
     ocupacao_media_global_pct = (media_medicos_ocupados / max(1, sim.num_doctors)) * 100.0
     if ocupacao_media_global_pct > 100.0: ocupacao_media_global_pct = 100.0
 
     sim.stats_geral = {
-        "tempo_medio_espera": float(np.mean(tempos_esp_arr)),
-        "tempo_medio_consulta": float(np.mean(tempos_cons_arr)),
-        "fila_media": float(np.mean(fila_arr)),
-        "fila_max": int(np.max(fila_arr)) if fila_arr.size > 0 else 0,
+        "tempo_medio_espera": acc.espera.media,
+        "tempo_medio_consulta": acc.consulta.media,
+        "fila_media": acc.fila.media(decorrido),
+        "fila_max": int(acc.fila.maximo),
         "ocupacao_media_medicos": ocupacao_media_global_pct,
-        "doentes_atendidos": int(sim.doentes_atendidos)
+        "doentes_atendidos": int(acc.doentes_atendidos)
     }
-    
-    t_medio_clinica = float(np.mean(sim.tempos_clinica)) if sim.tempos_clinica else 0.0
 
     return {
         "tempo_medio_espera": sim.stats_geral["tempo_medio_espera"],
-        "variancia_tempo_espera": float(np.var(tempos_esp_arr)) if len(tempos_esp_arr)>1 else 0.0,
+        "variancia_tempo_espera": acc.espera.variancia,
         "tempo_medio_consulta": sim.stats_geral["tempo_medio_consulta"],
-        "variancia_tempo_consulta": float(np.var(tempos_cons_arr)) if len(tempos_cons_arr)>1 else 0.0,
-        "tempo_medio_na_clinica": t_medio_clinica,
+        "variancia_tempo_consulta": acc.consulta.variancia,
+        "tempo_medio_na_clinica": acc.clinica.media,
         "fila_media": sim.stats_geral["fila_media"],
         "fila_max": sim.stats_geral["fila_max"],
         "ocupacao_media_medicos": sim.stats_geral["ocupacao_media_medicos"],
         "doentes_atendidos": sim.stats_geral["doentes_atendidos"],
+        "tempo_max_espera": acc.espera.maximo if acc.espera.n else 0.0,
+        **acc.quantis_espera(),
+        "cauda": metricas_cauda(sim._estado.colunas()) if cauda else {},
         "stats_por_medico": sim.stats_por_medico 
     }
 
@@ -177,153 +343,253 @@ class SimulacaoClinica:
         self.arrival_profile = kwargs.get('arrival_profile')
         self.pacientes: List[Paciente] = kwargs.get('pacientes', [])
         self.doctor_specialties = kwargs.get('doctor_specialties', {})
+        # Espaçamento (em minutos) das amostras de fila_sizes / ocupacao_medicos
+        self.resolucao_timeline = float(kwargs.get('resolucao_timeline', 1))
+        if self.resolucao_timeline <= 0: self.resolucao_timeline = 1.0
+        # Fonte de chegadas fornecida pelo utilizador (ex.: repetir um dia registado): iterável
+        # de tempos ordenados ou de pares (tempo, índice do paciente), lido de forma preguiçosa
+        self.fonte_chegadas = kwargs.get('fonte_chegadas')
+        # Motor de triagem (por omissão o partilhado com o carregador e a interface)
+        self._triagem: Triagem = kwargs.get('triagem') or TRIAGEM
+        # Modo compacto: estado dos pacientes em arrays NumPy em vez de dicionários
+        self.compacto = bool(kwargs.get('compacto', False))
+        # "direta", "inversao" ou "antitetica" (ver aleatorio.AMOSTRAGENS)
+        self.amostragem = kwargs.get('amostragem', "direta")
+        # Tempos de consulta: médias por especialidade, fatores por prioridade, dados para a
+        # distribuição empírica e coeficiente de variação da lognormal/gama (ver servico.py)
+        self.medias_especialidade = kwargs.get('medias_especialidade') or {}
+        self.fatores_prioridade = kwargs.get('fatores_prioridade') or {}
+        self.dados_servico = kwargs.get('dados_servico')
+        self.cv_servico = kwargs.get('cv_servico')
         self.reset()
 
     def reset(self):
-        self.tempos_espera = []; self.tempos_consulta = []; self.tempos_clinica = []
+        self._tempos = None
         self.fila_sizes = []; self.ocupacao_medicos = [] 
-        self.eventos = []; self.distritos_pacientes = []
+        self.distritos_pacientes = []
         self.doentes_atendidos = 0
-        self.stats_por_medico = {}; self.stats_geral = {}
-        self._rng = np.random.default_rng(self.seed)
+        self.stats_por_medico = {}; self.stats_geral = {}; self.estatisticas = {}
+        self.interrompida = False
+        self.agora = 0.0
+        self._acumulador = AcumuladorEstatisticas(self.num_doctors, self.simulation_time)
+        self._indice_consultas = None
+        # Um fluxo aleatório por fonte de incerteza (SeedSequence.spawn), para que cenários
+        # com a mesma seed partilhem chegadas, triagens e durações das consultas
+        fluxos = criar_fluxos(self.seed, self.amostragem)
+        self._rng_chegadas = fluxos["chegadas"]; self._rng_servico = fluxos["servico"]
+        self._rng_triagem = fluxos["triagem"]
+        # Duração sorteada à chegada (pela ordem de chegada) para quem ainda está na fila
+        self._servico_pendente: Dict[int, float] = {}
+        self._amostrador = AmostradorServico(self.service_distribution, self.mean_service_time, self._rng_servico,
+                                             medias_especialidade=self.medias_especialidade,
+                                             fatores_prioridade=self.fatores_prioridade,
+                                             dados=self.dados_servico, cv=self.cv_servico)
         self._heap = []
         self._counter = itertools.count()
-        self._chegada = {}; self._inicio = {}; self._saida = {}; self._duracao = {}
-        self._pid_to_pidx = {} 
-        self._paciente_medico = {} 
-        self.slots_ocupados = np.zeros(self.simulation_time + 500)
+        # Triagem: fallback sorteado com o gerador da simulação para todos os pacientes de uma vez
+        # (a mesma seed dá sempre as mesmas doenças) e um código por paciente para o resultado
+        self._fallback_idx = self._triagem.sortear_fallbacks(len(self.pacientes), self._rng_triagem)
+        self._triagem_cod = np.full(len(self.pacientes), -1, dtype=np.int32)
+        self._triagens = []; self._cod_triagem = {}
+        # Estado por paciente: dicionários por pid ou, no modo compacto, colunas NumPy
+        # com vistas que se comportam como os mesmos dicionários
+        self._estado = EstadoCompacto(self.pacientes) if self.compacto else EstadoDicionarios(self.pacientes)
+        self._chegada = self._estado.chegada; self._inicio = self._estado.inicio
+        self._saida = self._estado.saida; self._duracao = self._estado.duracao
+        self._pid_to_pidx = self._estado.pid_to_pidx
+        self._paciente_medico = self._estado.paciente_medico
+        self.eventos = self._estado.eventos
         self._medicos = []
+        self._livres = PoolMedicosLivres()
         i = 0
         while i < self.num_doctors:
             esp = self.doctor_specialties.get(str(i), FALLBACK_ESP)
             self._medicos.append({
-                "id": i, "livre": True, "fim": 0.0, "especialidade": esp, 
-                "last_event_time": 0.0, "num_atendidos": 0, "tempos_consulta": []
+                "id": i, "livre": True, "fim": 0.0, "paciente": None, "especialidade": esp, 
+                "last_event_time": 0.0, "num_atendidos": 0
             })
+            self._livres.libertar(i, esp)
             i += 1
         self._filas = {} 
-        self._pid_counter = 1
+        self._filas_nao_vazias = IndiceFilasNaoVazias()
+        # Funções em escada gravadas pelo ciclo de eventos: (tempo, valor) a cada mudança
+        self._fila_atual = 0; self._ocupados_atual = 0
+        self._timeline_fila_t = [0.0]; self._timeline_fila_v = [0]
+        self._timeline_ocup_t = [0.0]; self._timeline_ocup_v = [0]
         
-    def _gera_intervalo_chegada_homogeneo(self) -> float:
-        val = float('inf')
-        if self.pacientes: 
-            val = gera_intervalo_tempo_chegada(self.lambda_rate, rng=self._rng)
-        return val
-
-    def _gera_chegadas_nonhomogeneous(self):
-        if self.pacientes: 
-            profile = self.arrival_profile
-            if profile is None:
-                profile = [(0, 120, 5.0), (120, 300, 15.0), (300, 420, 25.0), (420, self.simulation_time, 10.0)]
-            pid_ctr = self._pid_counter; pidx = 0; idx_bloco = 0
-            while idx_bloco < len(profile):
-                bloco = profile[idx_bloco]; start_min, end_min, lam = bloco
-                if (end_min > start_min) and (lam > 0):
-                    t = float(start_min); taxa_min = lam / 60.0
-                    while (t < end_min) and (pidx < len(self.pacientes)):
-                        intervalo = float(self._rng.exponential(1.0 / taxa_min)); t += intervalo
-                        if (t < end_min) and (pidx < len(self.pacientes)):
-                            pid = f"p{pid_ctr}"; pid_ctr += 1
-                            self._chegada[pid] = t; heapq.heappush(self._heap, (t, next(self._counter), CHEGADA, pid))
-                            self._pid_to_pidx[pid] = pidx; pidx += 1
-                idx_bloco += 1
-            self._pid_counter = pid_ctr
-
-    def _gera_chegadas_homogeneo(self):
-        if self.pacientes: 
-            t = float(self._gera_intervalo_chegada_homogeneo()); pid_ctr = self._pid_counter; pidx = 0
-            while (t < self.simulation_time) and (pidx < len(self.pacientes)):
-                pid = f"p{pid_ctr}"; pid_ctr += 1
-                self._chegada[pid] = t; heapq.heappush(self._heap, (t, next(self._counter), CHEGADA, pid))
-                self._pid_to_pidx[pid] = pidx; pidx += 1
-                t += float(self._gera_intervalo_chegada_homogeneo())
-            self._pid_counter = pid_ctr
+    def _gera_chegadas_nonhomogeneous(self) -> Iterator[float]:
+        profile = self.arrival_profile
+        if profile is None:
+            profile = [(0, 120, 5.0), (120, 300, 15.0), (300, 420, 25.0), (420, self.simulation_time, 10.0)]
+        # Cada bloco do perfil é um processo de Poisson homogéneo gerado por blocos NumPy;
+        # o heapq.merge junta-os por ordem de tempo sem materializar nenhum
+        n = len(self.pacientes)
+        fontes = [itertools.chain.from_iterable(gera_blocos)
+                  for gera_blocos in (itera_tempos_chegada(lam, start_min, end_min, n, self._rng_chegadas)
+                                      for start_min, end_min, lam in profile)]
+        return heapq.merge(*fontes)
+
+    def _gera_chegadas_homogeneo(self) -> Iterator[float]:
+        return itertools.chain.from_iterable(
+            itera_tempos_chegada(self.lambda_rate, 0.0, self.simulation_time, len(self.pacientes), self._rng_chegadas))
+
+    def _fonte_chegadas(self) -> Iterator[Tuple[float, int]]:
+        # Uma chegada de cada vez: (tempo, índice do paciente). O índice segue a ordem de
+        # chegada e a fonte termina no horizonte ou quando se esgotam os pacientes (o
+        # horizonte é sempre finito: simulation_time limita também as fontes dadas).
+        dada = self.fonte_chegadas is not None
+        if dada: tempos = iter(self.fonte_chegadas)
+        elif self.arrival_pattern == "nao homogeneo": tempos = self._gera_chegadas_nonhomogeneous()
+        else: tempos = self._gera_chegadas_homogeneo()
+        n = len(self.pacientes); pidx = 0
+        anterior = 0.0; usados = bytearray(n) if dada else None
+        for item in tempos:
+            if pidx >= n: break
+            if dada: t, p = _item_chegada(item, pidx)
+            else: t, p = float(item), pidx
+            if t >= self.simulation_time: break
+            if dada:
+                # Uma fonte externa pode vir em mau estado: falha logo, com a chegada culpada
+                if not t >= anterior:
+                    raise ValueError(f"fonte_chegadas: tempo {t} da chegada {pidx} é negativo ou "
+                                     f"anterior ao da chegada precedente ({anterior})")
+                if not 0 <= p < n:
+                    raise ValueError(f"fonte_chegadas: paciente {p} da chegada {pidx} fora de 0..{n - 1}")
+                if usados[p]:
+                    raise ValueError(f"fonte_chegadas: paciente {p} chega mais do que uma vez (chegada {pidx})")
+                usados[p] = 1; anterior = t
+            yield t, p
+            pidx += 1
 
     # --- CORREÇÃO ABSOLUTA PARA O LATIM ---
+    # A triagem (filtro do latim, prioridade e especialidade) está no motor partilhado triagem.Triagem
     def _detectar_doenca_e_prioridade(self, p: Dict[str, Any]) -> Tuple[str, str, str]:
-        doenca_raw = ""
-        if isinstance(p, dict):
-            val = p.get("doenca")
-            if not val:
-                val = p.get("descrição")
-            if isinstance(val, str) and val != "":
-                doenca_raw = val.lower()
-
-        # AQUI ESTÁ O FILTRO FORTE:
-        # 1. Se for vazio
-        # 2. OU se tiver mais de 25 caracteres (Latim é longo)
-        # 3. OU se tiver palavras proibidas
-        is_bad = False
-        if not doenca_raw: is_bad = True
-        elif len(doenca_raw) > 25: is_bad = True # Corta frases longas em Latim
-        else:
-            lorem = ["nostrud", "ipsum", "magna", "amet"]
-            if any(x in doenca_raw for x in lorem): is_bad = True
-
-        if is_bad or doenca_raw == "virose":
-            opcoes = [
-                "gripe", "virose", "febre", "checkup",    
-                "perna partida", "entorse", "queda",      
-                "dor no peito", "arritmia", "enfarte",    
-                "falta de ar", "asma",                    
-                "dor de ouvidos", "otite"                 
-            ]
-            doenca_raw = random.choice(opcoes)
-
-        emergencias = ["angina", "enfarte", "fratura", "fractura", "sufocamento", "queimadura", "acidente", "peito", "arritmia"]
-        urgentes = ["febre", "dor", "cólica", "infecção", "covid", "gripe", "asma", "ar", "otite"]
-        
-        prioridade = "normal" 
-        found_emergency = False
-        i = 0
-        while i < len(emergencias) and not found_emergency:
-            if emergencias[i] in doenca_raw.lower():
-                prioridade = "urgente"; found_emergency = True
-            i += 1
-            
-        if not found_emergency:
-            found_urgent = False
-            j = 0
-            while j < len(urgentes) and not found_urgent:
-                if urgentes[j] in doenca_raw.lower():
-                    prioridade = "moderada"; found_urgent = True
-                j += 1
-
-        visualizacao_str = doenca_raw.capitalize() 
-        return doenca_raw, prioridade, visualizacao_str
+        doenca, prioridade, _, motivo = self._triagem.classificar(p)
+        return doenca, prioridade, motivo
 
     def _doenca_para_especialidade(self, doenca: str) -> str:
-        d = doenca.lower()
-        if d in DOENCA_TO_ESP: return DOENCA_TO_ESP[d]
-        for k, v in DOENCA_TO_ESP.items():
-            if k in d: return v
-        if "cardio" in d: return "cardiologia"
-        if "ortop" in d: return "ortopedia"
-        return FALLBACK_ESP
+        return self._triagem.especialidade(doenca)
+
+    def _triagem_paciente(self, pidx: int):
+        # Decidida uma única vez por paciente e registada: a saída da fila e as leituras
+        # posteriores reutilizam o mesmo resultado. O fallback usa o sorteio feito no reset.
+        cod = self._triagem_cod[pidx]
+        if cod >= 0:
+            return self._triagens[cod]
+        res = self._triagem.classificar(self.pacientes[pidx], escolha=self._fallback_idx[pidx])
+        cod = self._cod_triagem.get(res)
+        if cod is None:
+            cod = len(self._triagens); self._cod_triagem[res] = cod; self._triagens.append(res)
+        self._triagem_cod[pidx] = cod
+        return res
         
-    def _registar_ocupacao_timeline(self, minuto_inicio, duracao):
-        start = int(minuto_inicio)
-        end = min(start + int(math.ceil(duracao)), self.simulation_time)
-        if end > start: self.slots_ocupados[start:end] += 1
-    
-    def run(self):
-        self.reset()
-        if not self.pacientes: return
-        if self.arrival_pattern == "nao homogeneo": self._gera_chegadas_nonhomogeneous()
-        else: self._gera_chegadas_homogeneo()
-        self._filas[FALLBACK_ESP] = [] 
+    def _registar_fila(self, tempo, delta):
+        self._fila_atual += delta
+        self._timeline_fila_t.append(tempo); self._timeline_fila_v.append(self._fila_atual)
+        self._acumulador.registar_fila(tempo, self._fila_atual)
+
+    def _registar_ocupados(self, tempo, delta):
+        self._ocupados_atual += delta
+        self._timeline_ocup_t.append(tempo); self._timeline_ocup_v.append(self._ocupados_atual)
+        self._acumulador.registar_ocupados(tempo, self._ocupados_atual)
+
+    def _gerar_timelines(self, ate: Optional[float] = None):
+        # Amostra as funções em escada à resolução pedida (custo O(eventos + amostras)); numa
+        # corrida interrompida só até ao instante em que parou
+        fim = float(self.simulation_time) if ate is None else min(float(ate), float(self.simulation_time))
+        instantes = np.arange(0.0, fim, self.resolucao_timeline)
+        filas = amostrar_degraus(self._timeline_fila_t, self._timeline_fila_v, instantes)
+        ocupados = amostrar_degraus(self._timeline_ocup_t, self._timeline_ocup_v, instantes)
+        ocupados = np.minimum(ocupados, self.num_doctors)
+        self.fila_sizes = [int(v) for v in filas]
+        self.ocupacao_medicos = list((ocupados / max(1, self.num_doctors)) * 100.0)
+
+    def _instantaneo(self) -> Dict[str, Any]:
+        # Estado atual para visualização ao vivo: só leituras O(médicos + especialidades)
+        ac = self._acumulador; agora = self.agora
+        medicos = []
+        for m in self._medicos:
+            pidx = m.get("paciente")
+            if m["livre"] or pidx is None:
+                medicos.append(None)
+            else:
+                p = self.pacientes[pidx]
+                nome = p.get('nome', '') if isinstance(p, dict) else p.nome
+                medicos.append({"pidx": pidx, "paciente": nome, "motivo": self._triagem_paciente(pidx)[3]})
+        return {
+            "tempo": agora,
+            "filas": {esp: len(f) for esp, f in self._filas.items()},
+            "fila_total": self._fila_atual,
+            "ocupados": self._ocupados_atual,
+            "medicos": medicos,
+            "doentes_atendidos": ac.doentes_atendidos,
+            "tempo_medio_espera": ac.espera.media,
+            "fila_media": ac.fila.media(ate=agora),
+            "ocupacao_media_medicos": ac.ocupados.media(ate=agora) / max(1, self.num_doctors) * 100.0,
+        }
 
-        while self._heap:
-            tempo, _, tipo, pid = heapq.heappop(self._heap)
+    def _publicar(self, destino, item, final: bool = False):
+        # Fila limitada e GUI atrasada: perde-se o instantâneo (vem outro a seguir), nunca o
+        # fim; para esse descarta-se o mais antigo, sem bloquear se ninguém estiver a ler
+        while True:
+            try:
+                destino.put(item, block=False)
+                return
+            except queue.Full:
+                if not final: return
+                try: destino.get(block=False)
+                except queue.Empty: pass
+
+    def run(self, instantaneos=None, intervalo_instantaneos: float = 5.0, progresso=None, cancelar=None,
+            verificar_cada: int = 1000):
+        # instantaneos: fila onde se publica o estado a cada intervalo_instantaneos (e {"fim": True} no fim)
+        # progresso(fracao, tempo) e cancelar.is_set() são vistos a cada verificar_cada eventos
+        self.reset()
+        if not self.pacientes:
+            if instantaneos is not None: self._publicar(instantaneos, {"fim": True, "tempo": 0.0}, True)
+            return
+        prox_instantaneo = 0.0 if instantaneos is not None else math.inf
+        # Contagem decrescente até à próxima verificação (sem callbacks nunca chega a zero)
+        verificar = progresso is not None or cancelar is not None
+        faltam = verificar_cada if verificar else math.inf
+        horizonte = max(1.0, float(self.simulation_time))
+        self._filas[FALLBACK_ESP] = FilaPrioridade()
+        self._filas_nao_vazias.registar(FALLBACK_ESP)
+
+        # As chegadas são lidas uma a uma da fonte e só as saídas passam pelo heap, que fica
+        # limitado ao número de médicos. Em caso de empate a chegada é tratada primeiro.
+        fonte = self._fonte_chegadas()
+        prox_chegada = next(fonte, None)
+        while prox_chegada is not None or self._heap:
+            e_chegada = prox_chegada is not None and (not self._heap or prox_chegada[0] <= self._heap[0][0])
+            tempo = prox_chegada[0] if e_chegada else self._heap[0][0]
+            faltam -= 1
+            if faltam <= 0:
+                faltam = verificar_cada
+                if progresso is not None: progresso(min(1.0, tempo / horizonte), tempo)
+                if cancelar is not None and cancelar.is_set():
+                    # Pára antes de retirar o evento: o estado é o de até este instante
+                    self.interrompida = True
+                    self.agora = tempo
+                    break
+            if e_chegada:
+                pidx = prox_chegada[1]; tipo = CHEGADA
+                prox_chegada = next(fonte, None)
+                self._estado.registar_chegada(pidx, tempo)
+            else:
+                # O heap transporta o índice do paciente (int), não o pid em texto
+                tempo, _, tipo, pidx = heapq.heappop(self._heap)
+            if tempo >= prox_instantaneo:
+                # Estado até este evento (ainda por tratar), carimbado com o seu instante
+                self.agora = tempo
+                self._publicar(instantaneos, self._instantaneo())
+                prox_instantaneo = (math.floor(tempo / intervalo_instantaneos) + 1) * intervalo_instantaneos
+            self.agora = tempo
             
             if tipo == CHEGADA:
-                pidx = self._pid_to_pidx.get(pid)
-                if pidx is not None and pidx < len(self.pacientes):
+                if pidx < len(self.pacientes):
                     pdata = self.pacientes[pidx]
-                    # Garante que conseguimos ler os dados (seja objeto ou dicionário)
-                    p_info = pdata.__dict__ if not isinstance(pdata, dict) else pdata
-                    
-                    doenca, prio, motivo = self._detectar_doenca_e_prioridade(p_info)
+                    doenca, prio, esp_req, motivo = self._triagem_paciente(pidx)
 
                     # --- ALTERAÇÃO 1: Guardar a prioridade calculada no paciente ---
                     if isinstance(pdata, dict):
@@ -332,138 +598,120 @@ class SimulacaoClinica:
                         pdata.prioridade = prio
                     # ---------------------------------------------------------------
                     
-                    esp_req = self._doenca_para_especialidade(doenca)
+                    self._estado.registar_triagem(pidx, prio, esp_req)
                     
-                    # Tratamento seguro da morada
-                    try:
-                        if isinstance(pdata, dict):
+                    # Tratamento seguro da morada (o Paciente já traz o distrito calculado)
+                    if isinstance(pdata, dict):
+                        try:
                             morada = pdata.get('morada', {}).get('distrito', "Desconhecido")
-                        else:
-                            morada = pdata.morada.get('distrito') if pdata.morada else "Desconhecido"
-                    except:
-                        morada = "Desconhecido"
+                        except AttributeError:
+                            morada = "Desconhecido"
+                    else:
+                        morada = pdata.distrito
 
                     if morada: self.distritos_pacientes.append(morada)
                     
-                    if esp_req not in self._filas: self._filas[esp_req] = []
+                    if esp_req not in self._filas:
+                        self._filas[esp_req] = FilaPrioridade(); self._filas_nao_vazias.registar(esp_req)
 
-                    medico_idx = None; found = False
-                    
-                    # 1. TENTA ESPECIALISTA
-                    j = 0
-                    while j < self.num_doctors and not found:
-                        m = self._medicos[j]
-                        if m["livre"] and (m["especialidade"] == esp_req):
-                            medico_idx = j; found = True
-                        j += 1
-                    
-                    # 2. TENTA CLÍNICA GERAL (REDE DE SEGURANÇA)
-                    if not found:
-                        k = 0
-                        while k < self.num_doctors and not found:
-                            m = self._medicos[k]
-                            if m["livre"] and (m["especialidade"] == FALLBACK_ESP):
-                                medico_idx = k; found = True
-                            k += 1
+                    # A duração é sorteada já, pela ordem de chegada: o paciente k tem a mesma
+                    # consulta em qualquer cenário com a mesma seed, seja atendido quando for
+                    dur = self._amostrador.proximo(esp_req, prio)
+
+                    # 1. TENTA ESPECIALISTA; 2. TENTA CLÍNICA GERAL (REDE DE SEGURANÇA)
+                    medico_idx = self._livres.ocupar(esp_req)
+                    if medico_idx is None and esp_req != FALLBACK_ESP:
+                        medico_idx = self._livres.ocupar(FALLBACK_ESP)
                     
                     if medico_idx is not None:
-                        dur = gera_tempo_consulta(self.mean_service_time, self.service_distribution, self._rng)
-                        self._inicio[pid] = tempo; self._duracao[pid] = dur
+                        self._estado.registar_inicio(pidx, tempo, dur, medico_idx)
                         self._medicos[medico_idx]["livre"] = False
+                        self._medicos[medico_idx]["paciente"] = pidx
                         self._medicos[medico_idx]["num_atendidos"] += 1
-                        self._medicos[medico_idx]["tempos_consulta"].append(dur)
-                        self._paciente_medico[pid] = medico_idx 
-                        self._registar_ocupacao_timeline(tempo, dur)
-                        heapq.heappush(self._heap, (tempo + dur, next(self._counter), SAIDA, pid))
-                        self.eventos.append({"minuto_inicio": int(tempo), "duracao": dur, "medico": medico_idx, "paciente": pdata.nome, "especialidade": esp_req, "motivo": motivo})
+                        self._acumulador.registar_consulta(medico_idx, tempo, tempo, dur)
+                        self._registar_ocupados(tempo, +1)
+                        heapq.heappush(self._heap, (tempo + dur, next(self._counter), SAIDA, pidx))
+                        self._estado.registar_evento(int(tempo), dur, medico_idx, pidx, esp_req, motivo)
                     else:
-                        # --- ALTERAÇÃO 2: COLOCAR NA FILA E ORDENAR POR PRIORIDADE ---
-                        self._filas[esp_req].append(pid)
-
-                        # Mapa: Urgente(0) > Moderada(1) > Normal(2)
-                        mapa_val = {"urgente": 0, "moderada": 1, "normal": 2}
+                        # --- ALTERAÇÃO 2: COLOCAR NA FILA POR PRIORIDADE ---
+                        # A FilaPrioridade ordena por (prioridade, ordem de chegada) em O(log n),
+                        # mantendo Urgente > Moderada > Normal e a ordem de chegada dentro de cada classe
+                        self._filas[esp_req].append(pidx, prio)
+                        self._servico_pendente[pidx] = dur
+                        self._filas_nao_vazias.marcar(esp_req)
+                        self._registar_fila(tempo, +1)
 
-                        # Função auxiliar para ler a prioridade do paciente pelo ID
-                        def get_prio_val(p_id):
-                            idx = self._pid_to_pidx[p_id]
-                            pat = self.pacientes[idx]
-                            # Lê prioridade de forma segura (funciona para dict ou classe)
-                            p_val = pat.get('prioridade', 'normal') if isinstance(pat, dict) else getattr(pat, 'prioridade', 'normal')
-                            return mapa_val.get(p_val, 2)
-
-                        # O sort do Python é 'estável': mantém a ordem de chegada para prioridades iguais
-                        self._filas[esp_req].sort(key=get_prio_val)
-                        # -------------------------------------------------------------
-
-                        self.eventos.append({"minuto_inicio": int(tempo), "duracao": 0, "medico": None, "paciente": pdata.nome, "especialidade": esp_req, "motivo": motivo})
+                        self._estado.registar_evento(int(tempo), 0, None, pidx, esp_req, motivo)
 
             elif tipo == SAIDA:
-                found_idx = self._paciente_medico.get(pid)
-                self._saida[pid] = tempo; self.doentes_atendidos += 1
+                found_idx = self._estado.medico_de(pidx)
+                self._estado.registar_saida(pidx, tempo); self.doentes_atendidos += 1
+                self._acumulador.registar_saida()
                 
                 if found_idx is not None:
                     self._medicos[found_idx]["livre"] = True
+                    self._registar_ocupados(tempo, -1)
                     esp_med = self._medicos[found_idx]["especialidade"]
                     prox_pid = None
                     
-                    # 1. Médico verifica a SUA fila (Como já está ordenada, o pop(0) tira o mais urgente)
+                    # 1. Médico verifica a SUA fila (A FilaPrioridade devolve sempre o mais urgente)
                     if esp_med in self._filas and self._filas[esp_med]: 
-                        prox_pid = self._filas[esp_med].pop(0)
+                        prox_pid = self._filas[esp_med].pop()
                     
                     # 2. Se for Clínica Geral, ajuda nas outras filas se estiver livre
                     elif esp_med == FALLBACK_ESP:
                         if FALLBACK_ESP in self._filas and self._filas[FALLBACK_ESP]:
-                            prox_pid = self._filas[FALLBACK_ESP].pop(0)
+                            prox_pid = self._filas[FALLBACK_ESP].pop()
                         else:
-                            all_queues = list(self._filas.keys())
-                            q_idx = 0
-                            while q_idx < len(all_queues) and not prox_pid:
-                                k = all_queues[q_idx]
-                                if self._filas[k]: prox_pid = self._filas[k].pop(0)
-                                q_idx += 1
-
-                    if prox_pid:
-                        pidx2 = self._pid_to_pidx.get(prox_pid); pdata2 = self.pacientes[pidx2]
-                        # Re-detectar motivo para registo correto
-                        p_info2 = pdata2.__dict__ if not isinstance(pdata2, dict) else pdata2
-                        doenca2, _, motivo2 = self._detectar_doenca_e_prioridade(p_info2)
-                        
-                        esp2 = self._doenca_para_especialidade(doenca2)
+                            esp_outra = self._filas_nao_vazias.primeira(self._filas)
+                            if esp_outra is not None: prox_pid = self._filas[esp_outra].pop()
+
+                    if prox_pid is not None:
+                        # Motivo e especialidade vêm da triagem feita à chegada (sem recalcular)
+                        _, _, esp2, motivo2 = self._triagem_paciente(prox_pid)
                         
-                        dur2 = gera_tempo_consulta(self.mean_service_time, self.service_distribution, self._rng)
-                        self._inicio[prox_pid] = tempo; self._duracao[prox_pid] = dur2
+                        dur2 = self._servico_pendente.pop(prox_pid)
+                        self._estado.registar_inicio(prox_pid, tempo, dur2, found_idx)
                         self._medicos[found_idx]["livre"] = False
+                        self._medicos[found_idx]["paciente"] = prox_pid
                         self._medicos[found_idx]["num_atendidos"] += 1
-                        self._medicos[found_idx]["tempos_consulta"].append(dur2)
-                        self._paciente_medico[prox_pid] = found_idx
-                        self._registar_ocupacao_timeline(tempo, dur2)
+                        self._acumulador.registar_consulta(found_idx, self._estado.chegada_de(prox_pid), tempo, dur2)
+                        self._registar_fila(tempo, -1); self._registar_ocupados(tempo, +1)
                         heapq.heappush(self._heap, (tempo + dur2, next(self._counter), SAIDA, prox_pid))
-                        self.eventos.append({"minuto_inicio": int(tempo), "duracao": dur2, "medico": found_idx, "paciente": pdata2.nome, "especialidade": esp2, "motivo": motivo2})
-
-        minuto = 0
-        while minuto < self.simulation_time:
-            chegada_c = 0; inicio_c = 0
-            for pk, tc in self._chegada.items():
-                if tc <= minuto:
-                    chegada_c += 1
-                    ti = self._inicio.get(pk)
-                    if ti is not None and ti <= minuto: inicio_c += 1
-            f_size = max(0, chegada_c - inicio_c)
-            self.fila_sizes.append(f_size)
-            
-            n_ocupados = min(self.slots_ocupados[minuto], self.num_doctors)
-            pct = (n_ocupados / max(1, self.num_doctors)) * 100.0
-            self.ocupacao_medicos.append(pct)
-            minuto += 1
-
-        for pid, tini in self._inicio.items():
-            tch = self._chegada.get(pid); dur = self._duracao.get(pid)
-            if tch and dur:
-                self.tempos_espera.append(tini - tch)
-                self.tempos_consulta.append(dur)
-                tsai = self._saida.get(pid)
-                if tsai: self.tempos_clinica.append(tsai - tch)
-                else: self.tempos_clinica.append((tini - tch) + dur)
-
-        calcular_estatisticas(self)   
+                        self._estado.registar_evento(int(tempo), dur2, found_idx, prox_pid, esp2, motivo2)
+                    else:
+                        self._livres.libertar(found_idx, esp_med)
+
+        self._gerar_timelines(self.agora if self.interrompida else None)
+
+        if self.interrompida:
+            self.estatisticas = calcular_estatisticas(self, ate=self.agora)
+            self.estatisticas.update(interrompida=True, tempo_interrupcao=self.agora)
+        else:
+            self.estatisticas = calcular_estatisticas(self)
+        if progresso is not None and not self.interrompida: progresso(1.0, self.agora)
+        if instantaneos is not None:
+            self._publicar(instantaneos, {**self._instantaneo(), "fim": True}, True)
+
+    def _tempos_por_consulta(self):
+        # Espera, consulta e tempo na clínica de cada consulta, só montados se alguém os ler
+        # (as estatísticas saem do acumulador e das colunas do estado)
+        if self._tempos is None:
+            self._tempos = self._estado.tempos()
+        return self._tempos
+
+    tempos_espera = property(lambda self: self._tempos_por_consulta()[0])
+    tempos_consulta = property(lambda self: self._tempos_por_consulta()[1])
+    tempos_clinica = property(lambda self: self._tempos_por_consulta()[2])
+
+    def indice_consultas(self):
+        # Índice das consultas por médico para a animação, construído na primeira chamada
+        if self._indice_consultas is None:
+            self._indice_consultas = self._estado.indice_consultas(self.num_doctors)
+        return self._indice_consultas
+
+    def estatisticas_parciais(self) -> dict:
+        # Estatísticas até ao instante atual (pode ser chamada de outra thread durante run());
+        # sai só do acumulador, sem a cauda por grupo, por isso custa O(médicos)
+        return calcular_estatisticas(self, ate=self.agora, cauda=False)   
     
\ No newline at end of file
@@ -0,0 +1,118 @@
+import random
+import re
+import numpy as np
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- CONSTANTES DA TRIAGEM ---
+FALLBACK_ESP = "clinica_geral"
+
+DOENCA_TO_ESP = {
+    "asma": "pneumologia", "bronquite": "pneumologia", "covid": "pneumologia", "falta de ar": "pneumologia",
+    "diabetes": "endocrinologia", "obesidade": "endocrinologia",
+    "angina": "cardiologia", "arritmia": "cardiologia", "hipertensão": "cardiologia", "dor no peito": "cardiologia", "enfarte": "cardiologia",
+    "fractura": "ortopedia", "fratura": "ortopedia", "queda": "ortopedia", "luxacao": "ortopedia", "entorse": "ortopedia", "perna partida": "ortopedia",
+    "otite": "otorrino", "rinite": "otorrino", "sinusite": "otorrino", "dor de ouvidos": "otorrino",
+    "geriatria_cronica": "geriatria", "demencia": "geriatria",
+    "febre": "clinica_geral", "virose": "clinica_geral", "gripe": "clinica_geral", "dor de cabeça": "clinica_geral", "checkup": "clinica_geral"
+}
+
+EMERGENCIAS = ["angina", "enfarte", "fratura", "fractura", "sufocamento", "queimadura", "acidente", "peito", "arritmia"]
+URGENTES = ["febre", "dor", "cólica", "infecção", "covid", "gripe", "asma", "ar", "otite"]
+PALAVRAS_LOREM = ["nostrud", "ipsum", "magna", "amet"]
+
+# Doenças sorteadas quando a descrição não serve (vazia, longa demais ou em latim)
+OPCOES_FALLBACK = [
+    "gripe", "virose", "febre", "checkup",
+    "perna partida", "entorse", "queda",
+    "dor no peito", "arritmia", "enfarte",
+    "falta de ar", "asma",
+    "dor de ouvidos", "otite"
+]
+
+# Resultado da triagem: (doença, prioridade, especialidade, motivo para mostrar)
+ResultadoTriagem = Tuple[str, str, str, str]
+
+
+def _alternativa(palavras: List[str]) -> str:
+    return "|".join(re.escape(p) for p in palavras)
+
+
+class Triagem:
+    """Motor de triagem partilhado pela simulação, pelo carregador e pela interface.
+
+    As listas de palavras-chave são compiladas uma única vez em expressões regulares, por
+    isso cada descrição é classificada numa passagem por lista em vez de um ciclo de
+    substrings por palavra. Os resultados por texto ficam em cache (os textos repetem-se
+    muito num dataset grande).
+    """
+
+    def __init__(self, doenca_to_esp: Optional[Dict[str, str]] = None,
+                 emergencias: Optional[List[str]] = None, urgentes: Optional[List[str]] = None):
+        self.doenca_to_esp = dict(doenca_to_esp if doenca_to_esp is not None else DOENCA_TO_ESP)
+        self._re_emergencia = re.compile(_alternativa(emergencias if emergencias is not None else EMERGENCIAS))
+        self._re_urgente = re.compile(_alternativa(urgentes if urgentes is not None else URGENTES))
+        self._re_lorem = re.compile(_alternativa(PALAVRAS_LOREM))
+        # Lookahead para apanhar ocorrências sobrepostas; em cada posição o regex tenta as
+        # chaves pela ordem do dicionário, que é a ordem de desempate usada antes
+        self._chaves = list(self.doenca_to_esp.keys())
+        self._ordem_chave = {k: i for i, k in enumerate(self._chaves)}
+        self._re_doenca = re.compile("(?=(" + _alternativa(self._chaves) + "))")
+        self.classificar_texto = lru_cache(maxsize=65536)(self._classificar_texto)
+
+    @staticmethod
+    def texto_paciente(p: Any) -> str:
+        # Lê "doenca" ou, na falta dela, "descrição", seja o paciente um objeto ou um dict
+        if isinstance(p, dict):
+            val = p.get("doenca") or p.get("descrição")
+        else:
+            # Num Paciente, doenca == "" já diz que a descrição não serve (não se vai lê-la)
+            val = getattr(p, "doenca", None)
+            if val is None: val = getattr(p, "descrição", None)
+        return val.lower() if isinstance(val, str) and val != "" else ""
+
+    def precisa_fallback(self, texto: str) -> bool:
+        # Vazio, com mais de 25 caracteres (o latim é longo) ou com palavras proibidas
+        return (not texto) or len(texto) > 25 or self._re_lorem.search(texto) is not None or texto == "virose"
+
+    def prioridade(self, texto: str) -> str:
+        t = texto.lower()
+        if self._re_emergencia.search(t): return "urgente"
+        if self._re_urgente.search(t): return "moderada"
+        return "normal"
+
+    def especialidade(self, texto: str) -> str:
+        d = texto.lower()
+        esp = self.doenca_to_esp.get(d)
+        if esp is not None: return esp
+        melhor = None
+        for m in self._re_doenca.finditer(d):
+            k = m.group(1)
+            if melhor is None or self._ordem_chave[k] < self._ordem_chave[melhor]:
+                melhor = k
+        if melhor is not None: return self.doenca_to_esp[melhor]
+        if "cardio" in d: return "cardiologia"
+        if "ortop" in d: return "ortopedia"
+        return FALLBACK_ESP
+
+    def _classificar_texto(self, doenca: str) -> ResultadoTriagem:
+        return doenca, self.prioridade(doenca), self.especialidade(doenca), doenca.capitalize()
+
+    def classificar(self, p: Any, escolha: Optional[int] = None) -> ResultadoTriagem:
+        # escolha: índice em OPCOES_FALLBACK já sorteado pelo chamador (a simulação sorteia-os
+        # com o seu próprio gerador). Sem ele recorre-se ao módulo random global.
+        texto = self.texto_paciente(p)
+        if self.precisa_fallback(texto):
+            if escolha is None:
+                texto = random.choice(OPCOES_FALLBACK)
+            else:
+                texto = OPCOES_FALLBACK[int(escolha) % len(OPCOES_FALLBACK)]
+        return self.classificar_texto(texto)
+
+    def sortear_fallbacks(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        # Um índice de fallback por paciente, sorteado de uma só vez
+        return rng.integers(0, len(OPCOES_FALLBACK), size=n, dtype=np.int8)
+
+
+# Instância partilhada por omissão
+TRIAGEM = Triagem()